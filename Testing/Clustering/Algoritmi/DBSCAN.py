@@ -1,36 +1,129 @@
+import numpy as np
 from sklearn.cluster import DBSCAN
-from sklearn.metrics import silhouette_score
 from Testing.Clustering.PathetumEnviroment import ClusterEnvironment
 from Testing.Clustering.ClusterAnalysis import ClusterAnalysis
+from Testing.Clustering.GridDBSCAN import GridDBSCAN
+from Testing.Clustering.KDistance import estimate_eps
+from Testing.Clustering.IncrementalDBSCAN import IncrementalDBSCAN
+from Testing.Clustering.DensitySweep import sweep_eps
+from Testing.Clustering.Coreset import expand_labels
 
 
 class DBSCANAnalysis(ClusterAnalysis):
-    def __init__(self, eps=5, min_samples=5):
-        super().__init__()
-        self.eps = eps
+    def __init__(self, eps=5, min_samples=5, silhouette_mode="sklearn", coreset_ratio=None, engine="grid",
+                 id_column=None):
+        super().__init__(silhouette_mode=silhouette_mode, coreset_ratio=coreset_ratio)
+        self.eps = eps  # A number, or "auto" to take it from the knee of the k-distance curve at every run
         self.min_samples = min_samples
         self.cluster_env = ClusterEnvironment()
+        # 'grid' (2D grid-hashed engine, same labels, bounded memory), 'sklearn' (generic DBSCAN) or
+        # 'incremental' (state kept between runs, only the changed points are reclustered)
+        self.engine = engine
+        # Column identifying the same point across runs in incremental mode (None = the coordinates)
+        self.id_column = id_column
+        self.incremental = None  # IncrementalDBSCAN state kept between runs
+        self.eps_ = None  # eps used by the last run
+        self.k_distance_curve = None  # Sorted k-distances of the last eps="auto" run
+
+    def _make_model(self, eps):
+        if self.engine == "grid":
+            return GridDBSCAN(eps=eps, min_samples=self.min_samples)
+        if self.engine == "sklearn":
+            return DBSCAN(eps=eps, min_samples=self.min_samples)
+        raise ValueError(f"Unknown engine '{self.engine}'. Use 'grid' or 'sklearn'.")
+
+    def estimate_eps(self, data):
+        """
+        Estimate eps from the knee of the sorted k-distance curve (k = min_samples), built with one
+        KD-tree and a single batched query. Returns (eps, curve); the curve is also kept in
+        self.k_distance_curve for inspection.
+        """
+        eps, self.k_distance_curve = estimate_eps(data[['x', 'y']].to_numpy(dtype=np.float64), self.min_samples,
+                                                  sample_weight=self._sample_weight(data))
+        print(f"Estimated eps: {eps:.4f} (knee of the {self.min_samples}-distance curve)")
+        return eps, self.k_distance_curve
+
+    def _compress_for_eps(self, data):
+        """
+        Coreset of `data` for a DBSCAN run, with cells at most eps / sqrt(2) wide: the rows merged
+        into one representative are then eps-neighbours of each other, as in the cells of
+        GridDBSCAN. Larger cells would leave about one representative per neighbourhood, and every
+        point would become core or noise depending on the weights alone. Sets self.eps_; with
+        eps="auto" it is estimated on the original rows, since on the coreset the k-distances of
+        representatives weighing min_samples or more are 0.
+        """
+        self.eps_ = self.estimate_eps(data)[0] if self.eps == "auto" else self.eps
+        return self._compress(data, max_cell_size=self.eps_ / np.sqrt(2))
+
+    def _sync_incremental(self, data):
+        """
+        Update the kept IncrementalDBSCAN state to `data` (inserting, deleting and moving only the
+        points that changed since the previous run) and return it. The labels are the ones a full
+        run on `data` would give. With eps="auto" eps is estimated on the first run only, so that
+        the state can be kept.
+        """
+        if self.coreset_ratio:
+            raise ValueError("The incremental engine works on the original points: coreset_ratio must be None.")
+        if self.incremental is None or self.incremental.min_samples != self.min_samples or \
+                (self.eps != "auto" and self.incremental.eps != self.eps):
+            self.eps_ = self.estimate_eps(data)[0] if self.eps == "auto" else self.eps
+            self.incremental = IncrementalDBSCAN(eps=self.eps_, min_samples=self.min_samples)
+        keys = data[self.id_column] if self.id_column else None
+        self.incremental.sync(data[['x', 'y']].to_numpy(dtype=np.float64), keys=keys)
+        changes = self.incremental.last_changes
+        print("DBSCAN state rebuilt" if changes['refit'] else
+              f"DBSCAN state updated: {changes['inserted']} inserted, {changes['deleted']} deleted, "
+              f"{changes['moved']} moved")
+        return self.incremental
+
+    def eps_sweep(self, data, eps_values):
+        """
+        DBSCAN labels for every eps in `eps_values` from one reachability computation (core
+        distances and the mutual reachability spanning forest up to the largest eps); each eps is
+        then extracted in O(n) with the labels a full run would give.
+        Returns {eps: {"labels", "noise_fraction", "n_clusters"}} with labels for the rows of `data`.
+        """
+        # Celle non più larghe di eps / sqrt(2) per il più piccolo eps richiesto
+        compressed = self._compress(data, max_cell_size=min(eps_values) / np.sqrt(2))
+        results = sweep_eps(compressed[['x', 'y']].to_numpy(dtype=np.float64), eps_values, self.min_samples,
+                            sample_weight=self._sample_weight(compressed))
+        for eps, result in results.items():
+            if compressed is not data:
+                result['labels'] = expand_labels(self.coreset, result['labels'])
+            print(f"eps={eps:.4g}: {result['n_clusters']} clusters, {result['noise_fraction']:.1%} noise")
+        return results
 
     def perform_clustering(self, data, **kwargs):
         """
         Perform DBSCAN clustering and visualize the results.
         """
-        dbscan = DBSCAN(eps=self.eps, min_samples=self.min_samples)
-        data['label_cluster'] = dbscan.fit_predict(data[['x', 'y']])
+        # Sul coreset ogni rappresentante conta come `weight` punti nel calcolo dei core point
+        compressed = self._compress(data) if self.engine == "incremental" else self._compress_for_eps(data)
+        sample_weight = self._sample_weight(compressed)
+        if self.engine == "incremental":
+            dbscan = self._sync_incremental(compressed)
+            compressed['label_cluster'] = dbscan.labels_
+        else:
+            dbscan = self._make_model(self.eps_)
+            compressed['label_cluster'] = dbscan.fit_predict(compressed[['x', 'y']], sample_weight=sample_weight)
 
         # Check the number of unique clusters (ignoring noise points, i.e., label -1)
-        unique_clusters = set(data['label_cluster'])
+        unique_clusters = set(compressed['label_cluster'])
         if len(unique_clusters - {-1}) >= 2:  # At least 2 clusters (excluding noise)
-            silhouette_avg = silhouette_score(
-                data[data['label_cluster'] != -1][['x', 'y']],
-                data[data['label_cluster'] != -1]['label_cluster']
+            clustered = compressed['label_cluster'] != -1
+            silhouette_avg = self._silhouette(
+                compressed[clustered][['x', 'y']],
+                compressed[clustered]['label_cluster'],
+                weights=sample_weight[clustered.to_numpy()] if sample_weight is not None else None
             )
             print(f"Silhouette Score: {silhouette_avg:.2f}")
         else:
             silhouette_avg = None
             print("Silhouette Score: Not available (less than 2 clusters)")
 
+        data = self._expand(data, compressed)
+
         # Visualize results using ClusterEnvironment
-        self.cluster_env.update_environment(data, step_title=f"DBSCAN Clustering (eps={self.eps}, min_samples={self.min_samples})")
+        self.cluster_env.update_environment(data, step_title=f"DBSCAN Clustering (eps={self.eps_:.4g}, min_samples={self.min_samples})")
 
         return dbscan, silhouette_avg
\ No newline at end of file
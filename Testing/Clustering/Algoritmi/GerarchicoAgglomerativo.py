@@ -1,21 +1,94 @@
+import time
+import tracemalloc
 import numpy as np
-from sklearn.cluster import AgglomerativeClustering
 from scipy.cluster.hierarchy import dendrogram, linkage
-import plotly.figure_factory as ff
+from sklearn.cluster import AgglomerativeClustering
+from sklearn.metrics import adjusted_rand_score
+from sklearn.neighbors import kneighbors_graph
+import plotly.graph_objects as go
+from matplotlib.colors import to_hex
 from Testing.Clustering.PathetumEnviroment import ClusterEnvironment
 from Testing.Clustering.ClusterAnalysis import ClusterAnalysis
+from Testing.Clustering.FitCache import FitCache
+from Testing.Clustering.EMST import forest_labels
+from Testing.Clustering.LinkageSweep import sweep_linkages
 
 
 class HAClusterAnalysis(ClusterAnalysis):
 
-    def __init__(self, linkage_method='ward', cluster_env=None):
-        super().__init__()
+    def __init__(self, linkage_method='ward', cluster_env=None, n_neighbors=None, silhouette_mode="sklearn"):
+        super().__init__(silhouette_mode=silhouette_mode)
         self.linkage_method = linkage_method  # 'ward', 'complete', 'average', 'single', or 'centroid'
         self.cluster_env = cluster_env if cluster_env else ClusterEnvironment()
+        # With n_neighbors, merges are restricted to a k-nearest-neighbour graph (near-linear memory);
+        # exact for ward and single, approximate for average and complete (see connectivity_linkage)
+        self.n_neighbors = n_neighbors
+        self._linkages = {}  # (fingerprint delle coordinate, metodo, vicini) -> matrice di linkage
+
+    def linkage_matrix(self, data):
+        """
+        Linkage matrix of the points for the current linkage method, computed once per dataset and
+        reused by threshold selection, label extraction and the dendrogram.
+        """
+        coordinates = data[['x', 'y']].to_numpy(dtype=np.float64)
+        key = (FitCache.fingerprint(coordinates), self.linkage_method, self.n_neighbors)
+        if key not in self._linkages:
+            if self.n_neighbors is None:
+                self._linkages[key] = linkage(coordinates, method=self.linkage_method)
+            else:
+                self._linkages[key] = self.connectivity_linkage(coordinates)
+        return self._linkages[key]
+
+    def connectivity_linkage(self, coordinates):
+        """
+        Linkage matrix of a connectivity-constrained agglomerative clustering: only pairs of
+        clusters joined by an edge of the sparse k-nearest-neighbour graph can merge, so memory
+        stays O(n * n_neighbors) instead of the O(n^2) distance matrix. Disconnected components of
+        the graph are joined by sklearn. Merge heights are not always monotone under the constraint.
+
+        Quality depends on the linkage: ward and single keep the unconstrained labels (ARI 1.0 on 9k
+        points with n_neighbors=10, 2-6x faster), while average and complete are computed by sklearn
+        over the graph edges only, which changes the criterion. Their labels can differ a lot from
+        the unconstrained tree (ARI 0.0-0.6 on the same data, typically a few outliers split off
+        instead of the large groups), and a larger graph (30 or 100 neighbours) does not fix it.
+        """
+        if self.linkage_method == 'centroid':
+            raise ValueError("Connectivity-constrained clustering supports 'ward', 'complete', 'average' and 'single'.")
+        n_points = len(coordinates)
+        connectivity = kneighbors_graph(coordinates, n_neighbors=min(self.n_neighbors, n_points - 1),
+                                        include_self=False)
+        model = AgglomerativeClustering(n_clusters=1, linkage=self.linkage_method, connectivity=connectivity,
+                                        compute_full_tree=True, compute_distances=True).fit(coordinates)
+
+        # Albero di sklearn (children_, distances_) nel formato scipy: la quarta colonna conta i punti
+        sizes = np.ones(2 * n_points - 1)
+        for step, (first, second) in enumerate(model.children_):
+            sizes[n_points + step] = sizes[first] + sizes[second]
+        return np.column_stack([model.children_, model.distances_, sizes[n_points:]])
+
+    @staticmethod
+    def labels_from_linkage(linked, distance_threshold=None, n_clusters=None):
+        """
+        Flat 0-based labels cut from a linkage matrix, either below a distance threshold or into
+        n_clusters. As in AgglomerativeClustering, a threshold keeps one cluster per merge at distance
+        >= threshold and the tree is cut by undoing the last merges in merge order, which stays
+        correct when the heights are not monotone (connectivity-constrained trees).
+        """
+        n_points = len(linked) + 1
+        if distance_threshold is not None:
+            n_clusters = int(np.count_nonzero(linked[:, 2] >= distance_threshold)) + 1
+        n_clusters = int(np.clip(n_clusters, 1, n_points))
+
+        # Le prime n - k fusioni come archi figlio -> nodo interno; le componenti connesse sono i cluster
+        children = linked[:, :2].astype(np.int64).ravel()
+        parents = np.repeat(np.arange(n_points, 2 * n_points - 1), 2)
+        _, labels = forest_labels(2 * n_points - 1, children, parents, 2 * (n_points - n_clusters))
+        return labels[:n_points]
 
     def run_hierarchical(self, data, distance_threshold=None, n_clusters=None):
         """
         Run Agglomerative Clustering with either a distance threshold or a specified number of clusters.
+        The labels are cut from the cached linkage matrix, which is returned with the data.
         """
         # Validate the parameters
         if distance_threshold is not None and n_clusters is not None:
@@ -25,27 +98,19 @@ class HAClusterAnalysis(ClusterAnalysis):
             distance_threshold = self.calculate_best_distance_threshold(data)
             print(f"Using calculated distance threshold: {distance_threshold}")
 
-        # Initialize Agglomerative Clustering with the specified parameters
-        if distance_threshold is not None:
-            agglomerative = AgglomerativeClustering(
-                n_clusters=None, distance_threshold=distance_threshold, linkage=self.linkage_method
-            )
-        else:
-            agglomerative = AgglomerativeClustering(
-                n_clusters=n_clusters, distance_threshold=None, linkage=self.linkage_method
-            )
-
-        # Fit and predict cluster labels
-        data['label_cluster'] = agglomerative.fit_predict(data[['x', 'y']])
-        return agglomerative, data
+        # Cut the tree with the specified parameters
+        linked = self.linkage_matrix(data)
+        data['label_cluster'] = self.labels_from_linkage(linked, distance_threshold=distance_threshold,
+                                                         n_clusters=n_clusters)
+        return linked, data
 
     def perform_clustering(self, data, distance_threshold=None, n_clusters=None):
         """
         Perform clustering using Agglomerative Clustering. Either a distance threshold
-        or a number of clusters can be specified.
+        or a number of clusters can be specified. Returns the linkage matrix.
         """
         # Run the hierarchical clustering
-        model, clustered_data = self.run_hierarchical(data, distance_threshold=distance_threshold, n_clusters=n_clusters)
+        linked, clustered_data = self.run_hierarchical(data, distance_threshold=distance_threshold, n_clusters=n_clusters)
 
         # Visualize results using ClusterEnvironment
         n_clusters_result = len(np.unique(clustered_data['label_cluster']))
@@ -54,15 +119,20 @@ class HAClusterAnalysis(ClusterAnalysis):
             step_title=f"Agglomerative Clustering - {n_clusters_result} clusters"
         )
 
-        return model
+        return linked
 
     def calculate_best_distance_threshold(self, data):
         """
         Calculate the best distance threshold based on the largest gap in the linkage matrix.
         """
-        # Compute the linkage matrix
-        linked = linkage(data[['x', 'y']], method=self.linkage_method)
+        # Compute the linkage matrix (or reuse the cached one)
+        return self.threshold_from_linkage(self.linkage_matrix(data))
 
+    @staticmethod
+    def threshold_from_linkage(linked):
+        """
+        Merge distance just after the largest gap between successive (sorted) merge distances.
+        """
         # Extract distances from the linkage matrix
         distances = linked[:, 2]  # Column 2 contains the distances of merges
         sorted_distances = np.sort(distances)
@@ -76,34 +146,123 @@ class HAClusterAnalysis(ClusterAnalysis):
 
         return best_threshold
 
-    def plot_dendrogram(self, data, threshold_suggestion=None):
+    def evaluate_linkages(self, data, methods=("single", "complete", "average", "ward"), n_jobs=-1):
         """
-        Plot an interactive dendrogram for hierarchical clustering using Plotly.
+        Build the linkages of several methods at once: the condensed distances are computed a single
+        time and shared read-only with worker processes, one linkage per worker (ward, centroid and
+        median are built from the coordinates); small datasets are swept sequentially. The matrices are added to the cache, so
+        plot_dendrogram and run_hierarchical reuse them when linkage_method is switched.
+        Returns {method: {'linkage', 'threshold', 'labels'}}, the labels being cut at the threshold.
         """
-        # Compute linkage matrix
-        linked = linkage(data[['x', 'y']], method=self.linkage_method)
+        coordinates = data[['x', 'y']].to_numpy(dtype=np.float64)
+        fingerprint = FitCache.fingerprint(coordinates)
+        linkages = {method: self._linkages.get((fingerprint, method, None)) for method in methods}
+        missing = [method for method, linked in linkages.items() if linked is None]
+        if missing:
+            linkages.update(sweep_linkages(coordinates, missing, n_jobs=n_jobs))
 
-        # Create Plotly dendrogram
-        fig = ff.create_dendrogram(
-            linked,
-            orientation='bottom',
-            color_threshold=threshold_suggestion
-        )
+        results = {}
+        for method, linked in linkages.items():
+            self._linkages[(fingerprint, method, None)] = linked
+            threshold = self.threshold_from_linkage(linked)
+            results[method] = {
+                "linkage": linked,
+                "threshold": threshold,
+                "labels": self.labels_from_linkage(linked, distance_threshold=threshold),
+            }
+        return results
+
+    def connectivity_report(self, data, n_clusters=3, n_neighbors_values=(5, 10, 30)):
+        """
+        Compare connectivity-constrained runs against the unconstrained one for several graph
+        sizes: run time, peak traced memory, label agreement (ARI) and silhouette at n_clusters.
+        For average and complete linkage the ARI is expected to be low (see connectivity_linkage).
+        """
+        coordinates = data[['x', 'y']].to_numpy(dtype=np.float64)
+
+        def measure(n_neighbors):
+            def build():
+                analysis = HAClusterAnalysis(linkage_method=self.linkage_method, cluster_env=self.cluster_env,
+                                             n_neighbors=n_neighbors)
+                return self.labels_from_linkage(analysis.linkage_matrix(data), n_clusters=n_clusters)
 
-        # Retrieve leaf node positions (the individual data points)
-        leaf_positions = np.array([i for i in range(len(data))])
+            start = time.perf_counter()
+            labels = build()
+            elapsed = time.perf_counter() - start
+            # La memoria si misura in una seconda esecuzione: tracemalloc rallenta molto le allocazioni
+            tracemalloc.start()
+            build()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            silhouette = self._silhouette(coordinates, labels) if len(np.unique(labels)) > 1 else None
+            return labels, elapsed, peak, silhouette
 
-        # Generate the number of ticks for the X-axis (all data points)
-        labels = list(data.index)  # Default to using data indices as labels
-        label_interval = 10  # Show every 10th label (or choose a different number)
+        full_labels, full_time, full_peak, full_silhouette = measure(None)
+        report = []
+        for n_neighbors in n_neighbors_values:
+            labels, elapsed, peak, silhouette = measure(n_neighbors)
+            report.append({
+                "n_neighbors": n_neighbors,
+                "time": elapsed,
+                "speedup": full_time / elapsed,
+                "peak_memory": peak,
+                "memory_ratio": peak / full_peak,
+                "ari": adjusted_rand_score(full_labels, labels),
+                "silhouette": silhouette,
+            })
 
-        sampled_labels = labels[::label_interval]  # Select every N-th label
-        tickvals = leaf_positions[::label_interval]  # Corresponding tick positions
+        print(f"Unconstrained {self.linkage_method} linkage on {len(coordinates)} points: {full_time:.3f}s, "
+              f"peak memory {full_peak / 2 ** 20:.1f} MiB, silhouette {full_silhouette}")
+        for row in report:
+            print(f"n_neighbors={row['n_neighbors']}: {row['time']:.3f}s (x{row['speedup']:.1f}), "
+                  f"peak memory {row['peak_memory'] / 2 ** 20:.1f} MiB (x{row['memory_ratio']:.2f}), "
+                  f"ARI {row['ari']:.3f}, silhouette {row['silhouette']}")
+        if self.linkage_method in ("average", "complete"):
+            print(f"Note: with a connectivity graph {self.linkage_method} linkage is computed over the graph edges "
+                  f"only, so its labels can differ from the unconstrained ones whatever n_neighbors (see the ARI).")
 
+        return report
+
+    def plot_dendrogram(self, data, threshold_suggestion=None, max_leaves=100, collapse_below=None):
+        """
+        Plot an interactive dendrogram for hierarchical clustering using Plotly.
+        Level of detail: only the top merges are drawn, with at most max_leaves leaves (the last
+        p merges); with collapse_below, the subtrees merged below that distance become single
+        leaves. Collapsed leaves are labelled with their point count, e.g. "(42)", so the figure
+        size does not grow with n. max_leaves=None draws every point.
+        """
+        if not self.cluster_env.plots_enabled:
+            return
+
+        # Reuse the cached linkage matrix
+        linked = self.linkage_matrix(data)
+        n_leaves = len(data)
+        if collapse_below is not None:
+            n_leaves = int(np.count_nonzero(linked[:, 2] >= collapse_below)) + 1
+        if max_leaves is not None:
+            n_leaves = min(n_leaves, max_leaves)
+        truncated = n_leaves < len(data)
+
+        # Coordinate dei segmenti da scipy, senza disegnarli; una traccia per colore (separatori None)
+        tree = dendrogram(linked, truncate_mode='lastp' if truncated else None, p=n_leaves, no_plot=True,
+                          labels=[str(label) for label in data.index], show_leaf_counts=True,
+                          color_threshold=threshold_suggestion)
+        fig = go.Figure()
+        clusters = [color for color in dict.fromkeys(tree['color_list']) if color != 'C0']
+        for color in dict.fromkeys(tree['color_list']):
+            links = [index for index, link_color in enumerate(tree['color_list']) if link_color == color]
+            x = [value for index in links for value in tree['icoord'][index] + [None]]
+            y = [value for index in links for value in tree['dcoord'][index] + [None]]
+            name = "Above threshold" if color == 'C0' else f"Cluster {clusters.index(color)}"
+            fig.add_trace(go.Scatter(x=x, y=y, mode='lines', line=dict(color=to_hex(color), width=1),
+                                     hoverinfo='y', name=name))
+
+        # Leaves sit at x = 5, 15, 25, ... in scipy's layout
+        tickvals = 5 + 10 * np.arange(len(tree['ivl']))
         fig.update_layout(
             xaxis=dict(
                 tickvals=tickvals,
-                ticktext=sampled_labels,
+                ticktext=tree['ivl'],  # Point labels, or "(count)" for collapsed subtrees
                 tickangle=90,  # Rotate labels to prevent overlap
                 tickfont=dict(size=10)  # Adjust font size
             )
@@ -115,7 +274,7 @@ class HAClusterAnalysis(ClusterAnalysis):
             fig.add_shape(
                 type="line",
                 x0=0,
-                x1=len(data) - 1,  # Extend the threshold line across all data points
+                x1=10 * len(tree['ivl']),  # Extend the threshold line across all leaves
                 y0=threshold_suggestion,
                 y1=threshold_suggestion,
                 line=dict(color="red", width=2, dash="dash"),
@@ -123,18 +282,20 @@ class HAClusterAnalysis(ClusterAnalysis):
                 yref="y"
             )
 
-        # Increase the figure width and height to provide more space for labels and tree
+        title = f"Dendrogram (Linkage: {self.linkage_method.capitalize()})"
+        if truncated:
+            title += f" - top {len(tree['ivl'])} of {len(data)} leaves"
+        # The width follows the number of drawn leaves, capped as before
         fig.update_layout(
-            title=f"Dendrogram (Linkage: {self.linkage_method.capitalize()})",
-            xaxis_title="Data Points",
+            title=title,
+            xaxis_title="Data Points (leaf counts in parentheses)" if truncated else "Data Points",
             yaxis_title="Distance",
             showlegend=True,
             template="plotly_white",
-            width=2000,  # Increase width
+            width=min(2000, max(800, 20 * len(tree['ivl']))),
             height=800,  # Adjust height
             margin=dict(l=50, r=50, t=50, b=150)  # Ensure enough bottom margin for labels
         )
 
         # Display interactive dendrogram
-        fig.show()
-
+        self.cluster_env.render(fig, f"Dendrogram {self.linkage_method}")
@@ -1,15 +1,21 @@
+import heapq
 import numpy as np
-from scipy.spatial.distance import pdist, squareform
-from sklearn.metrics import silhouette_score
+from scipy.spatial.distance import cdist
 from Testing.Clustering.PathetumEnviroment import ClusterEnvironment
 from Testing.Clustering.ClusterAnalysis import ClusterAnalysis
 
 
 class HDClusterAnalysis(ClusterAnalysis):
-    def __init__(self, n_clusters=None):
-        super().__init__()
+    def __init__(self, n_clusters=None, silhouette_mode="sklearn", coreset_ratio=None, block_elements=2 ** 22,
+                 bisecting_iter=0):
+        super().__init__(silhouette_mode=silhouette_mode, coreset_ratio=coreset_ratio)
         self.n_clusters = n_clusters  # This can be None, or an integer
         self.cluster_env = ClusterEnvironment()
+        # Distances are computed in blocks of at most block_elements entries (32 MiB by default):
+        # memory stays O(n) instead of the n x n matrix
+        self.block_elements = block_elements
+        # Optional bisecting 2-means refinement of every split (number of Lloyd iterations, 0 = off)
+        self.bisecting_iter = bisecting_iter
 
     def fit_predict(self, data):
         """
@@ -17,12 +23,23 @@ class HDClusterAnalysis(ClusterAnalysis):
         Se è specificato un numero di cluster (n_clusters), l'algoritmo si ferma quando si raggiunge quel numero.
         Se n_clusters è impostato su None, l'algoritmo si ferma quando viene raggiunta una condizione di arresto naturale.
         """
+        # Pesi dei rappresentanti del coreset (None sui dati originali)
+        weights = self._sample_weight(data)
+
         # Inizializza tutti i punti in un unico cluster.
-        clusters = {0: data.index.tolist()}
+        clusters = {0: data.index.to_numpy()}
         current_cluster_count = 1
 
-        # Matrice delle distanze
-        distances = squareform(pdist(data[['x', 'y']], metric='euclidean'))
+        # Coordinate dei punti: le distanze si calcolano a blocchi, solo dentro il cluster che serve
+        coordinates = data[['x', 'y']].to_numpy(dtype=np.float64)
+
+        # Max-heap (dissimilarità negata, etichetta): ogni cluster viene valutato una sola volta, alla
+        # creazione; a parità di valore esce l'etichetta più bassa, come nel max() sul dizionario.
+        # La radice non viene mai confrontata con altri cluster: non serve calcolarne la dissimilarità
+        heap = [(0.0, 0)]
+        dissimilarities = {}
+        # Stato del criterio di arresto, aggiornato a ogni divisione
+        total_dissimilarity, singletons = 0.0, int(len(clusters[0]) == 1)
 
       #Continua a suddividere fino a quando non si verifica una delle seguenti condizioni:
         #1. Il numero di cluster specificato (`n_clusters`) viene raggiunto (se è stato specificato).
@@ -33,19 +50,27 @@ class HDClusterAnalysis(ClusterAnalysis):
                 break
 
             # Find the cluster with the highest average dissimilarity
-            cluster_to_split = max(clusters.keys(), key=lambda c: self._average_dissimilarity(clusters[c], distances))
+            _, cluster_to_split = heapq.heappop(heap)
 
             # Split the cluster into two
             cluster_indices = clusters.pop(cluster_to_split)
-            new_labels = self._split_cluster(data.iloc[cluster_indices], distances[cluster_indices][:, cluster_indices])
+            total_dissimilarity -= dissimilarities.pop(cluster_to_split, 0.0)
+            singletons -= len(cluster_indices) == 1
+            new_labels = self._split_cluster(coordinates[cluster_indices],
+                                             weights[cluster_indices] if weights is not None else None)
 
             # Assign the split clusters to new clusters
-            clusters[current_cluster_count] = [cluster_indices[i] for i in range(len(cluster_indices)) if new_labels[i] == 0]
-            clusters[current_cluster_count + 1] = [cluster_indices[i] for i in range(len(cluster_indices)) if new_labels[i] == 1]
+            clusters[current_cluster_count] = cluster_indices[new_labels == 0]
+            clusters[current_cluster_count + 1] = cluster_indices[new_labels == 1]
+            for label in (current_cluster_count, current_cluster_count + 1):
+                dissimilarities[label] = self._average_dissimilarity(clusters[label], coordinates, weights)
+                heapq.heappush(heap, (-dissimilarities[label], label))
+                total_dissimilarity += dissimilarities[label]
+                singletons += len(clusters[label]) == 1
             current_cluster_count += 2
 
             # If n_clusters is None, check if we should stop based on natural conditions
-            if self.n_clusters is None and not self._should_continue(clusters, distances):
+            if self.n_clusters is None and not self._should_continue(len(clusters), singletons, total_dissimilarity):
                 break
 
         # Crea label per i cluster
@@ -55,47 +80,81 @@ class HDClusterAnalysis(ClusterAnalysis):
 
         return labels
 
-    def _average_dissimilarity(self, indices, distances):
+    def _average_dissimilarity(self, indices, coordinates, weights=None):
         """
-        Calculate the average dissimilarity for a cluster.
+        Calculate the average dissimilarity for a cluster (mean distance over all ordered pairs,
+        weighted by the representatives' weights if given), in blocks of rows.
         """
-        cluster_distances = distances[np.ix_(indices, indices)]
-        return np.mean(cluster_distances)
-
-    def _split_cluster(self, data, distances):
+        points = coordinates[indices]
+        if len(points) == 0:
+            return 0.0
+        # Media pesata sulle coppie: ogni rappresentante vale `weight` punti coincidenti
+        cluster_weights = np.ones(len(points)) if weights is None else weights[indices]
+        block_rows = max(1, self.block_elements // max(len(points), 1))
+
+        # Solo i blocchi sopra la diagonale: i blocchi fuori diagonale contano due volte (simmetria)
+        total = 0.0
+        for begin in range(0, len(points), block_rows):
+            end = min(begin + block_rows, len(points))
+            column_sums = cluster_weights[begin:end] @ cdist(points[begin:end], points[begin:])
+            total += column_sums[:end - begin] @ cluster_weights[begin:end] \
+                + 2 * column_sums[end - begin:] @ cluster_weights[end:]
+        return total / cluster_weights.sum() ** 2
+
+    def _split_cluster(self, coordinates, weights=None):
         """
-        Split a cluster into two using the farthest point from the mean as a seed.
+        Split a cluster into two using the farthest point from the mean as a seed: the points
+        closer to the seed than its mean distance join it, the others form the second cluster.
+        Vectorized on the coordinate array (O(m) time and memory); with bisecting_iter > 0 the split
+        is then refined by that many bisecting 2-means (Lloyd) iterations.
         """
         # Find the farthest point from the cluster centroid
-        centroid = data.mean().values
-        farthest_point = np.argmax(np.linalg.norm(data[['x', 'y']].values - centroid, axis=1))
-
-        # Initialize two clusters with the farthest point and the next farthest
-        cluster1, cluster2 = [farthest_point], []
-        for i in range(len(data)):
-            if i != farthest_point:
-                if distances[farthest_point, i] < np.mean(distances[farthest_point, :]):
-                    cluster1.append(i)
-                else:
-                    cluster2.append(i)
-
-        # Assign the split
-        labels = np.zeros(len(data))
-        labels[cluster2] = 1
+        centroid = np.average(coordinates, axis=0, weights=weights)
+        farthest_point = np.argmax(np.linalg.norm(coordinates - centroid, axis=1))
+        # Only the distances from the seed are needed: one row, O(m) memory
+        seed_distances = cdist(coordinates[farthest_point:farthest_point + 1], coordinates)[0]
+        threshold = np.average(seed_distances, weights=weights)
+
+        # Il seme resta sempre nel primo cluster
+        labels = (seed_distances >= threshold).astype(np.float64)
+        labels[farthest_point] = 0
+
+        if self.bisecting_iter:
+            labels = self._bisect(coordinates, labels, weights)
+        return labels
+
+    def _bisect(self, coordinates, labels, weights=None):
+        """
+        Bisecting 2-means refinement: Lloyd iterations with two centroids starting from `labels`,
+        stopped when no point changes side or a side would become empty.
+        """
+        weights = np.ones(len(coordinates)) if weights is None else weights
+        for _ in range(self.bisecting_iter):
+            second = labels == 1
+            if second.all() or not second.any():
+                break
+            centroids = np.array([np.average(coordinates[~second], axis=0, weights=weights[~second]),
+                                  np.average(coordinates[second], axis=0, weights=weights[second])])
+            # Più vicino al secondo centroide = oltre l'asse del segmento tra i due (un solo prodotto)
+            new_labels = ((coordinates - centroids.mean(axis=0)) @ (centroids[1] - centroids[0]) > 0).astype(np.float64)
+            if np.array_equal(new_labels, labels) or new_labels.all() or not new_labels.any():
+                break
+            labels = new_labels
         return labels
 
-    def _should_continue(self, clusters, distances):
+    def _should_continue(self, n_clusters, singletons, total_dissimilarity):
         """
         Determine whether the clustering process should continue.
-        This is a stopping condition function.
+        This is a stopping condition function, evaluated in O(1) from the number of clusters, the
+        number of single-point clusters and the sum of the cluster dissimilarities.
         """
         # Example stopping condition 1: If all clusters have size 1 (can't split further)
-        if any(len(indices) == 1 for indices in clusters.values()):
+        if singletons > 0:
             return False
 
         # Example stopping condition 2: If the average dissimilarity between clusters is small
         # Compute average dissimilarity between clusters
-        avg_dissimilarity = np.mean([self._average_dissimilarity(indices, distances) for indices in clusters.values()])
+        avg_dissimilarity = total_dissimilarity / n_clusters
         if avg_dissimilarity < 0.1:  # Set a threshold value
             return False
 
@@ -105,19 +164,24 @@ class HDClusterAnalysis(ClusterAnalysis):
         """
         Perform divisive hierarchical clustering and visualize the results.
         """
-        labels = self.fit_predict(data)
+        # Con coreset_ratio le distanze si calcolano sugli m rappresentanti invece che sugli n punti
+        compressed = self._compress(data)
+        labels = self.fit_predict(compressed)
 
         # Assign the generated labels to the data
-        data['label_cluster'] = labels
+        compressed['label_cluster'] = labels
 
         # Calculate silhouette score (if possible)
-        if len(set(data['label_cluster'])) > 1:
-            silhouette_avg = silhouette_score(data[['x', 'y']], data['label_cluster'])
+        if len(set(compressed['label_cluster'])) > 1:
+            silhouette_avg = self._silhouette(compressed[['x', 'y']], compressed['label_cluster'],
+                                              weights=self._sample_weight(compressed))
             print(f"Silhouette Score: {silhouette_avg:.2f}")
         else:
             silhouette_avg = None
             print("Silhouette Score: Not available (less than 2 clusters)")
 
+        data = self._expand(data, compressed)
+
         # Visualize results using ClusterEnvironment
         self.cluster_env.update_environment(data, step_title="Divisive Clustering")
 
@@ -1,42 +1,177 @@
+import time
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import adjusted_rand_score
 import matplotlib.pyplot as plt
 from Testing.Dataset import random_points_generator as rpg
 from Testing.Clustering.PathetumEnviroment import ClusterEnvironment
 from Testing.Clustering.ClusterAnalysis import ClusterAnalysis
+from Testing.Clustering.KSweep import sweep_kmeans, sweep_kmeans_warm, fit_result, weighted_fingerprint, make_kmeans
+from Testing.Clustering.FitCache import FitCache
+from Testing.Clustering.KSearch import search_elbow, search_silhouette_max
 
 
 class KMeansAnalysis(ClusterAnalysis):
 
-    def __init__(self, max_clusters=10, n_clusters=3, cluster_env=None):
-        super().__init__()
+    def __init__(self, max_clusters=10, n_clusters=3, cluster_env=None, n_jobs=None, sweep_mode="independent",
+                 mode="full", batch_size=1024, silhouette_mode="sklearn", silhouette_sample_size=10000,
+                 random_state=None, cache=None, search="exhaustive", coreset_ratio=None):
+        super().__init__(silhouette_mode=silhouette_mode, silhouette_sample_size=silhouette_sample_size,
+                         coreset_ratio=coreset_ratio)
         self.max_clusters = max_clusters
         self.n_clusters = n_clusters
         self.cluster_env = cluster_env if cluster_env else ClusterEnvironment()
+        self.n_jobs = n_jobs  # Worker processes for the k sweeps (None/1 = sequential, -1 = all cores)
+        self.sweep_mode = sweep_mode  # 'independent' (one k-means++ fit per k) or 'warm' (k+1 seeded from k)
+        self.mode = mode  # 'full' (KMeans) or 'minibatch' (MiniBatchKMeans)
+        self.batch_size = batch_size
+        # Seed of the final fit: None draws one from RANDOM.ORG; 42 (the sweep seed) lets it reuse the sweep fit
+        self.random_state = random_state
+        # Fit cache shared by default with every other KMeansAnalysis; False disables it
+        self.cache = FitCache.shared() if cache is None else (cache if cache else None)
+        self.search = search  # k selection: 'exhaustive' sweep or 'golden' (O(log K) fits, approximate)
+        self.last_search = None  # Fits used/saved by the last k search
+
+    def _make_model(self, n_clusters, random_state, init=None):
+        # init: centroidi di partenza (un solo avvio) invece di k-means++
+        return make_kmeans(n_clusters, random_state, self.mode, self.batch_size, init=init)
 
     def run_kmeans(self, data, n_clusters):
         """
         Run KMeans with a given number of clusters and return the model and the data with cluster labels.
         """
-        kmeans = KMeans(n_clusters=n_clusters, random_state=rpg.get_random_seed())
-        data['label_cluster'] = kmeans.fit_predict(data[['x', 'y']])
+        # k arriva da np.argmax nelle ricerche: come int la chiave coincide con quella dello sweep
+        n_clusters = int(n_clusters)
+        random_state = self.random_state if self.random_state is not None else rpg.get_random_seed()
+        coordinates = data[['x', 'y']].to_numpy(dtype=np.float64)
+        sample_weight = self._sample_weight(data)
+        kmeans = self._make_model(n_clusters, random_state)
+
+        # Con un seed casuale il fit non si ripete mai: la cache si usa solo con seed fisso
+        key, cached = None, None
+        if self.cache is not None and self.random_state is not None and self.mode == "full":
+            key = self.cache.make_key(weighted_fingerprint(self.cache, coordinates, sample_weight), "kmeans",
+                                      n_clusters=n_clusters, random_state=random_state)
+            cached = self.cache.get(key)
+        if cached is not None:
+            # Il fit in cache è già a convergenza: un solo passo di Lloyd ricostruisce il modello
+            kmeans = KMeans(n_clusters=n_clusters, init=cached["centroids"], n_init=1, random_state=random_state)
+
+        data['label_cluster'] = kmeans.fit_predict(coordinates, sample_weight=sample_weight)
+        if key is not None and cached is None:
+            self.cache.put(key, fit_result(kmeans, data['label_cluster'].to_numpy()))
         return kmeans, data
 
+    def partial_fit_chunks(self, chunks, n_clusters=None, on_chunk=None):
+        """
+        Fit a MiniBatchKMeans incrementally, one chunk of orders at a time (e.g. the chunks of
+        pd.read_csv(..., chunksize=...)), so only one chunk is held in memory. `on_chunk`, if
+        given, is called with the coordinates of every chunk after its partial_fit.
+        """
+        random_state = self.random_state if self.random_state is not None else rpg.get_random_seed()
+        n_clusters = n_clusters if n_clusters else self.n_clusters
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=self.batch_size, random_state=random_state)
+        for chunk in chunks:
+            coordinates = chunk[['x', 'y']].to_numpy(dtype=np.float64)
+            kmeans.partial_fit(coordinates)
+            if on_chunk is not None:
+                on_chunk(coordinates)
+        return kmeans
+
+    def perform_streaming_clustering(self, chunks, n_clusters=None):
+        """
+        Cluster a stream of order chunks with partial_fit_chunks and return (model, silhouette),
+        like perform_clustering. The silhouette is computed on a reservoir sample of at most
+        silhouette_sample_size orders kept while streaming.
+        """
+        rng = np.random.default_rng(self.random_state)
+        n_clusters = n_clusters if n_clusters else self.n_clusters
+        reservoir = np.empty((0, 2))
+        seen = 0
+
+        def sample(coordinates):
+            nonlocal reservoir, seen
+            # Reservoir sampling (algoritmo R) vettorizzato sul chunk
+            room = self.silhouette_sample_size - len(reservoir)
+            if room > 0:
+                reservoir = np.vstack([reservoir, coordinates[:room]])
+            slots = rng.integers(0, np.arange(seen + max(room, 0), seen + len(coordinates)) + 1)
+            replace = slots < self.silhouette_sample_size
+            reservoir[slots[replace]] = coordinates[max(room, 0):][replace]
+            seen += len(coordinates)
+
+        kmeans = self.partial_fit_chunks(chunks, n_clusters, on_chunk=sample)
+
+        labels = kmeans.predict(reservoir)
+        if len(set(labels)) > 1:
+            silhouette_avg = self._silhouette(reservoir, labels)
+            print(f"Silhouette Score for {n_clusters} clusters (sample of {len(reservoir)}): {silhouette_avg:.2f}")
+        else:
+            silhouette_avg = None
+            print("Silhouette Score: Not available (less than 2 clusters)")
+
+        return kmeans, silhouette_avg
+
+    def minibatch_report(self, data, n_clusters=None, batch_sizes=(256, 1024, 4096)):
+        """
+        Compare MiniBatchKMeans against full-batch KMeans for several batch sizes: run time,
+        relative inertia, label agreement (ARI) and centroid displacement.
+        """
+        n_clusters = n_clusters if n_clusters else self.n_clusters
+        coordinates = data[['x', 'y']].to_numpy(dtype=np.float64)
+
+        start = time.perf_counter()
+        full = KMeans(n_clusters=n_clusters, random_state=42).fit(coordinates)
+        full_time = time.perf_counter() - start
+
+        report = []
+        for batch_size in batch_sizes:
+            start = time.perf_counter()
+            mini = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, random_state=42).fit(coordinates)
+            elapsed = time.perf_counter() - start
+
+            # Inerzia del modello minibatch valutata su tutti i punti, per un confronto equo
+            inertia = -mini.score(coordinates)
+            shift = np.min(np.linalg.norm(mini.cluster_centers_[:, None] - full.cluster_centers_[None], axis=2), axis=1)
+            report.append({
+                "batch_size": batch_size,
+                "time": elapsed,
+                "speedup": full_time / elapsed,
+                "inertia_ratio": inertia / full.inertia_,
+                "ari": adjusted_rand_score(full.labels_, mini.predict(coordinates)),
+                "max_centroid_shift": float(shift.max()),
+                "n_steps": mini.n_steps_,
+            })
+
+        print(f"Full-batch KMeans: {full_time:.3f}s, inertia {full.inertia_:.2f}")
+        for row in report:
+            print(f"batch_size={row['batch_size']}: {row['time']:.3f}s (x{row['speedup']:.1f}), "
+                  f"inertia ratio {row['inertia_ratio']:.4f}, ARI {row['ari']:.3f}, "
+                  f"max centroid shift {row['max_centroid_shift']:.2f}, steps {row['n_steps']}")
+
+        return report
+
     def perform_clustering(self, data, use_elbow=True):
         """
         Perform KMeans clustering using the optimal number of clusters determined by
         the Elbow Method or Silhouette Method.
         """
+        # Con coreset_ratio la ricerca di k, il fit e il silhouette lavorano sui rappresentanti pesati
+        compressed = self._compress(data)
+
         # Determine the optimal number of clusters
-        optimal_k = self.find_optimal_k(data, use_elbow)
+        optimal_k = self.find_optimal_k(compressed, use_elbow)
 
         # Perform KMeans with the optimal k
-        kmeans, clustered_data = self.run_kmeans(data, optimal_k)
+        kmeans, compressed = self.run_kmeans(compressed, optimal_k)
 
         # Calculate silhouette score
-        silhouette_avg = silhouette_score(data[['x', 'y']], clustered_data['label_cluster'])
+        # In modalità minibatch il silhouette esatto (O(n²)) viene sostituito dalla stima campionata
+        mode = "sampled" if self.mode == "minibatch" and self.silhouette_mode == "sklearn" else None
+        silhouette_avg = self._silhouette(compressed[['x', 'y']], compressed['label_cluster'], mode=mode,
+                                          weights=self._sample_weight(compressed))
         print(f"Silhouette Score for {optimal_k} clusters: {silhouette_avg:.2f}")
+        clustered_data = self._expand(data, compressed)
 
         # Visualize results using ClusterEnvironment
         self.cluster_env.update_environment(clustered_data, n_clusters=optimal_k,
@@ -44,8 +179,80 @@ class KMeansAnalysis(ClusterAnalysis):
 
         return kmeans, silhouette_avg
 
+    def cluster_iterations(self, iterations, use_elbow=True, drift_tolerance=0.5):
+        """
+        Cluster the iterations returned by load_and_parse_iterations in order. Iteration t starts
+        from the centroids of iteration t-1 and keeps its k, so it only needs a few Lloyd steps.
+        k is searched again (a cold pass, as in perform_clustering) on the first iteration and
+        whenever the warm fit's inertia per order drifts from the last cold pass by more than a
+        factor (1 + drift_tolerance), up or down.
+
+        Returns one report entry per iteration: k, Lloyd steps, time, speedup over the last cold
+        pass, and centroid drift (mean/max displacement from the previous iteration's centroids).
+        """
+        report = []
+        centroids, reference, cold_time = None, None, None
+
+        for iteration, data in iterations.items():
+            coordinates = data[['x', 'y']].to_numpy(dtype=np.float64)
+            random_state = self.random_state if self.random_state is not None else rpg.get_random_seed()
+            start = time.perf_counter()
+
+            cold = centroids is None
+            if not cold:
+                model = self._make_model(len(centroids), random_state, init=centroids)
+                data['label_cluster'] = model.fit_predict(coordinates)
+                # Deriva: l'inerzia per ordine con il k precedente si è allontanata (in un senso o nell'altro)
+                # da quella dell'ultima ricerca di k
+                ratio = model.inertia_ / len(coordinates) / reference
+                cold = not 1 / (1 + drift_tolerance) <= ratio <= 1 + drift_tolerance
+
+            if cold:
+                n_clusters = self.find_optimal_k(data, use_elbow)
+                model, data = self.run_kmeans(data, n_clusters)
+                reference = model.inertia_ / len(coordinates)
+
+            elapsed = time.perf_counter() - start
+            if cold:
+                cold_time = elapsed
+
+            # Spostamento dei centroidi: definito solo se k non è cambiato (stessi indici, partenza dai precedenti)
+            drift = None
+            if centroids is not None and len(centroids) == len(model.cluster_centers_):
+                drift = np.linalg.norm(model.cluster_centers_ - centroids, axis=1)
+            centroids = model.cluster_centers_
+
+            entry = {
+                "iteration": iteration,
+                "k": len(centroids),
+                "cold": cold,
+                "n_iter": model.n_iter_,
+                "time": elapsed,
+                "speedup": cold_time / elapsed,
+                "mean_drift": float(drift.mean()) if drift is not None else None,
+                "max_drift": float(drift.max()) if drift is not None else None,
+            }
+            report.append(entry)
+
+            drift_text = f", drift mean {entry['mean_drift']:.2f} / max {entry['max_drift']:.2f}" \
+                if drift is not None else ""
+            print(f"Iteration {iteration}: k={entry['k']} ({'cold' if cold else 'warm'}), {entry['n_iter']} Lloyd steps, "
+                  f"{elapsed:.3f}s (x{entry['speedup']:.1f}){drift_text}")
+
+            self.cluster_env.update_environment(data, n_clusters=entry['k'],
+                                                step_title=f"KMeans Clustering - iteration {iteration}")
+
+        return report
+
     def find_optimal_k(self, data, use_elbow=True):
 
+        if self.search == "golden":
+            optimal_k = self.search_optimal_k(data, use_elbow)
+            if optimal_k is not None:
+                return optimal_k
+        elif self.search != "exhaustive":
+            raise ValueError(f"Unknown search '{self.search}'. Use 'exhaustive' or 'golden'.")
+
         if use_elbow:
             optimal_k = self.elbow_method(data)
         else:
@@ -53,14 +260,76 @@ class KMeansAnalysis(ClusterAnalysis):
 
         return optimal_k
 
-    def elbow_method(self, data):
-        inertia_values = []
+    def search_optimal_k(self, data, use_elbow=True):
+        """
+        Locate the elbow (binary search) or the silhouette maximum (golden-section search)
+        with O(log K) fits. Returns None when the evaluated curve is not unimodal/convex or the
+        k values around the result contradict it, in which case find_optimal_k falls back to
+        the exhaustive sweep. The result can still differ from the exhaustive one when the
+        curve is irregular between the sampled k values.
+        """
+        def evaluate(k_values):
+            sweep = self.k_sweep(data, k_values, compute_silhouette=not use_elbow)
+            return dict(zip(sweep['k'], sweep['inertia'] if use_elbow else sweep['silhouette']))
+
+        if use_elbow:
+            optimal_k, evaluated = search_elbow(evaluate, 2, self.max_clusters)
+        else:
+            optimal_k, evaluated = search_silhouette_max(evaluate, 2, self.max_clusters)
+
+        # In caso di fallback i fit già fatti restano in cache, ma la scansione completa li richiede tutti
+        exhaustive_fits = self.max_clusters - 1
+        self.last_search = {
+            "fits": len(evaluated) if optimal_k is not None else exhaustive_fits,
+            "exhaustive_fits": exhaustive_fits,
+            "saved": exhaustive_fits - len(evaluated) if optimal_k is not None else 0,
+            "fallback": optimal_k is None,
+        }
+        method = "Elbow" if use_elbow else "Silhouette"
+        if optimal_k is None:
+            print(f"{method} search: curve not unimodal after {len(evaluated)} fits, falling back to the full sweep.")
+            return None
+
+        print(f"Optimal number of clusters ({method} search): {optimal_k} "
+              f"({len(evaluated)} fits instead of {exhaustive_fits}, {self.last_search['saved']} saved)")
+
+        # Tracciamento dei soli punti valutati
+        if self.cluster_env.plots_enabled:
+            ks = sorted(evaluated)
+            fig = plt.figure(figsize=(10, 6))
+            plt.plot(ks, [evaluated[k] for k in ks], marker='o', label="Inertia" if use_elbow else "Silhouette Score")
+            plt.axvline(x=optimal_k, color='red', linestyle='--', label=f"Optimal k: {optimal_k}")
+            plt.title(f'{method} Search')
+            plt.xlabel('Number of Clusters (k)')
+            plt.ylabel('Inertia' if use_elbow else 'Silhouette Score')
+            plt.legend()
+            self.cluster_env.render(fig, f'{method} Search')
+
+        return optimal_k
+
+    def k_sweep(self, data, k_values=None, compute_silhouette=False):
+        """
+        Fit KMeans for every k in `k_values` (default 2..max_clusters) and return the
+        inertia and silhouette curves, in parallel when n_jobs is set or warm-started
+        when sweep_mode is 'warm'. With mode='minibatch' the fits are MiniBatchKMeans.
+        """
+        if k_values is None:
+            k_values = range(2, self.max_clusters + 1)
+        # Come in perform_clustering: in modalità minibatch anche lo sweep usa il silhouette campionato
+        silhouette_mode = "sampled" if self.mode == "minibatch" and self.silhouette_mode == "sklearn" \
+            else self.silhouette_mode
+        options = {"random_state": 42, "compute_silhouette": compute_silhouette, "silhouette_mode": silhouette_mode,
+                   "silhouette_sample_size": self.silhouette_sample_size, "cache": self.cache,
+                   "sample_weight": self._sample_weight(data), "mode": self.mode, "batch_size": self.batch_size}
+        if self.sweep_mode == "warm":
+            return sweep_kmeans_warm(data[['x', 'y']].to_numpy(), k_values, **options)
+        if self.sweep_mode != "independent":
+            raise ValueError(f"Unknown sweep_mode '{self.sweep_mode}'. Use 'independent' or 'warm'.")
+        return sweep_kmeans(data[['x', 'y']].to_numpy(), k_values, n_jobs=self.n_jobs, **options)
 
+    def elbow_method(self, data):
         # Calcolo dell'inerzia per diversi valori di k
-        for n_clusters in range(2, self.max_clusters + 1):
-            kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-            kmeans.fit(data[['x', 'y']])
-            inertia_values.append(kmeans.inertia_)
+        inertia_values = self.k_sweep(data)['inertia']
 
         # Calcolo della differenza assoluta tra valori consecutivi di inerzia
         inertia_diff = np.abs(np.diff(inertia_values))
@@ -69,26 +338,22 @@ class KMeansAnalysis(ClusterAnalysis):
         elbow_index = np.argmax(inertia_diff < 0.1 * inertia_diff[0]) + 2
 
         # Tracciamento del grafico
-        plt.figure(figsize=(10, 6))
-        plt.plot(range(2, self.max_clusters + 1), inertia_values, marker='o', label="Inertia")
-        plt.axvline(x=elbow_index, color='red', linestyle='--', label=f"Optimal k: {elbow_index}")
-        plt.title('Elbow Method')
-        plt.xlabel('Number of Clusters (k)')
-        plt.ylabel('Inertia')
-        plt.legend()
-        plt.show()
+        if self.cluster_env.plots_enabled:
+            fig = plt.figure(figsize=(10, 6))
+            plt.plot(range(2, self.max_clusters + 1), inertia_values, marker='o', label="Inertia")
+            plt.axvline(x=elbow_index, color='red', linestyle='--', label=f"Optimal k: {elbow_index}")
+            plt.title('Elbow Method')
+            plt.xlabel('Number of Clusters (k)')
+            plt.ylabel('Inertia')
+            plt.legend()
+            self.cluster_env.render(fig, 'Elbow Method')
 
         print(f"Optimal number of clusters (Elbow Method): {elbow_index}")
         return elbow_index
 
     def refined_elbow_method(self, data, tolerance=1000):
-        inertia_values = []
-
         # Initial computation of inertia for range of cluster counts
-        for n_clusters in range(2, self.max_clusters + 1):
-            kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-            kmeans.fit(data[['x', 'y']])
-            inertia_values.append(kmeans.inertia_)
+        inertia_values = self.k_sweep(data)['inertia']
 
         def find_elbow(inertia, tolerance):
             """Finds elbow points by analyzing drops in inertia."""
@@ -107,12 +372,7 @@ class KMeansAnalysis(ClusterAnalysis):
         refined_elbow = None
         while len(elbow_indices) > 1:
             sub_range = list(range(elbow_indices[0] + 2, elbow_indices[-1] + 3))  # Adjust range to avoid overlap
-            inertia_values_sub = []
-
-            for n_clusters in sub_range:
-                kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-                kmeans.fit(data[['x', 'y']])
-                inertia_values_sub.append(kmeans.inertia_)
+            inertia_values_sub = self.k_sweep(data, sub_range)['inertia']
 
             elbow_indices = find_elbow(inertia_values_sub, tolerance)
 
@@ -123,47 +383,43 @@ class KMeansAnalysis(ClusterAnalysis):
         elbow_index = elbow_indices[0] if elbow_indices else (refined_elbow if refined_elbow else 2)
 
         # Plot the inertia values and the detected elbow point
-        plt.figure(figsize=(10, 6))
-        plt.plot(range(2, min(self.max_clusters + 1, len(data))), inertia_values, marker='o', label="Inertia")
-        plt.axvline(x=elbow_index, color='red', linestyle='--', label=f"Optimal k: {elbow_index}")
-        plt.title('Refined Elbow Method')
-        plt.xlabel('Number of Clusters (k)')
-        plt.ylabel('Inertia')
-        plt.legend()
-        plt.show()
+        if self.cluster_env.plots_enabled:
+            fig = plt.figure(figsize=(10, 6))
+            plt.plot(range(2, min(self.max_clusters + 1, len(data))), inertia_values, marker='o', label="Inertia")
+            plt.axvline(x=elbow_index, color='red', linestyle='--', label=f"Optimal k: {elbow_index}")
+            plt.title('Refined Elbow Method')
+            plt.xlabel('Number of Clusters (k)')
+            plt.ylabel('Inertia')
+            plt.legend()
+            self.cluster_env.render(fig, 'Refined Elbow Method')
 
         print(f"Refined optimal number of clusters: {elbow_index}")
         return elbow_index
 
     def silhouette_method(self, data):
-        silhouette_scores = []
-
-        for n_clusters in range(2, self.max_clusters + 1):
-            kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-            labels = kmeans.fit_predict(data[['x', 'y']])
-            silhouette_avg = silhouette_score(data[['x', 'y']], labels)
-            silhouette_scores.append(silhouette_avg)
-
-        # Plotting silhouette scores
-        plt.figure(figsize=(10, 6))
-        plt.plot(range(2, self.max_clusters + 1), silhouette_scores, marker='o', label="Silhouette Score")
-        plt.title('Silhouette Method')
-        plt.xlabel('Number of Clusters (k)')
-        plt.ylabel('Silhouette Score')
-        plt.legend()
+        silhouette_scores = self.k_sweep(data, compute_silhouette=True)['silhouette']
 
         # Determine the optimal k and silhouette score
         optimal_k = np.argmax(silhouette_scores) + 2  # +2 because range starts from 2
         optimal_silhouette = silhouette_scores[optimal_k - 2]  # Index adjustment
 
-        # Draw vertical line at the optimal k
-        plt.axvline(x=optimal_k, color='red', linestyle='--', label=f"Optimal k: {optimal_k}")
-
-        # Draw horizontal line at the silhouette score for the optimal k
-        plt.axhline(y=optimal_silhouette, color='red', linestyle='--',
-                    label=f"Silhouette Score: {optimal_silhouette:.2f}")
+        # Plotting silhouette scores
+        if self.cluster_env.plots_enabled:
+            fig = plt.figure(figsize=(10, 6))
+            plt.plot(range(2, self.max_clusters + 1), silhouette_scores, marker='o', label="Silhouette Score")
+            plt.title('Silhouette Method')
+            plt.xlabel('Number of Clusters (k)')
+            plt.ylabel('Silhouette Score')
+
+            # Draw vertical line at the optimal k
+            plt.axvline(x=optimal_k, color='red', linestyle='--', label=f"Optimal k: {optimal_k}")
+
+            # Draw horizontal line at the silhouette score for the optimal k
+            plt.axhline(y=optimal_silhouette, color='red', linestyle='--',
+                        label=f"Silhouette Score: {optimal_silhouette:.2f}")
+            plt.legend()
+            self.cluster_env.render(fig, 'Silhouette Method')
 
         print(f"Optimal number of clusters (Silhouette Method): {optimal_k}")
-        plt.show()
 
         return optimal_k
@@ -1,61 +1,123 @@
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 from scipy.spatial import distance_matrix
 from scipy.sparse.csgraph import minimum_spanning_tree
 from Testing.Clustering.PathetumEnviroment import ClusterEnvironment
 from Testing.Clustering.ClusterAnalysis import ClusterAnalysis
 from Testing.Clustering.Algoritmi.KMEANS import KMeansAnalysis
+from Testing.Clustering.EMST import euclidean_mst, single_linkage, forest_labels, gap_n_clusters, \
+    inconsistency_n_clusters
+from Testing.Clustering.FitCache import FitCache
 
 
 class KruskalClustering(ClusterAnalysis):
 
-    def __init__(self, n_clusters=3, max_clusters=10, cluster_env=None):
-        super().__init__()
+    def __init__(self, n_clusters=3, max_clusters=10, cluster_env=None, silhouette_mode="sklearn", coreset_ratio=None,
+                 mst_method="delaunay", cache=None, k_selection="gap"):
+        super().__init__(silhouette_mode=silhouette_mode, coreset_ratio=coreset_ratio)
         self.n_clusters = n_clusters  # Maximum allowed clusters
         self.max_clusters = max_clusters
         self.cluster_env = cluster_env if cluster_env else ClusterEnvironment()
-
-    def run_kruskal(self, data, n_clusters):
+        # 'delaunay' (sparse EMST, O(n) memory) or 'dense' (n x n distance matrix, the original path)
+        self.mst_method = mst_method
+        # MST and merge order are cached per dataset (shared FitCache by default; False disables it)
+        self.cache = FitCache.shared() if cache is None else (cache if cache else None)
+        # k selection: 'gap' or 'inconsistency' (from the MST, O(n log n)) or 'silhouette' (KMeans sweep)
+        self.k_selection = k_selection
+
+    def minimum_spanning_edges(self, data):
         """
-        Perform Kruskal-based clustering.
+        Edges of the MST of the points as (rows, cols, weights) arrays.
         """
-        from scipy.sparse.csgraph import connected_components
+        coordinates = data[['x', 'y']].to_numpy(dtype=np.float64)
+        if self.mst_method == "delaunay":
+            return euclidean_mst(coordinates)
+        if self.mst_method != "dense":
+            raise ValueError(f"Unknown mst_method '{self.mst_method}'. Use 'delaunay' or 'dense'.")
 
-        # Compute pairwise distance matrix
-        dist_matrix = distance_matrix(data[['x', 'y']], data[['x', 'y']])
+        # Compute pairwise distance matrix and build the Minimum Spanning Tree (MST)
+        mst = minimum_spanning_tree(distance_matrix(coordinates, coordinates)).tocoo()
+        return mst.row.astype(np.int64), mst.col.astype(np.int64), mst.data
 
-        # Build the Minimum Spanning Tree (MST)
-        mst = minimum_spanning_tree(dist_matrix).toarray()
+    def spanning_tree(self, data):
+        """
+        MST of the dataset with its edges in single-linkage merge order, plus the linkage matrix
+        (the single-linkage dendrogram). Computed once per dataset and then read from the cache.
+        Returns a dict with 'rows', 'cols', 'weights' and 'linkage'.
+        """
+        key = None
+        if self.cache is not None:
+            fingerprint = self.cache.fingerprint(data[['x', 'y']].to_numpy(dtype=np.float64))
+            key = self.cache.make_key(fingerprint, "mst", method=self.mst_method)
+            tree = self.cache.get(key)
+            if tree is not None:
+                return tree
+
+        rows, cols, weights, linkage = single_linkage(len(data), *self.minimum_spanning_edges(data))
+        tree = {"rows": rows, "cols": cols, "weights": weights, "linkage": linkage}
+        if key is not None:
+            self.cache.put(key, tree)
+        return tree
+
+    def labels_for_k(self, data, n_clusters):
+        """
+        Labels for n_clusters clusters, i.e. the MST without its n_clusters - 1 longest edges.
+        After the first call on a dataset this is a single O(n) connected-components pass.
+        Returns (labels, n_components).
+        """
+        tree = self.spanning_tree(data)
+        n_components, labels = forest_labels(len(data), tree["rows"], tree["cols"],
+                                             len(data) - max(n_clusters, 1))
+        return labels, n_components
 
-        # Get the sorted list of edges (distance, i, j)
-        edges = sorted(
-            [(mst[i, j], i, j) for i in range(len(mst)) for j in range(len(mst)) if mst[i, j] > 0],
-            key=lambda x: x[0],
-            reverse=True
-        )
+    def label_sweep(self, data, k_values):
+        """
+        Labels for every k in `k_values` from the same cached MST: {k: labels}.
+        """
+        return {k: self.labels_for_k(data, k)[0] for k in k_values}
 
-        # Remove the longest n_clusters - 1 edges
-        for _ in range(n_clusters - 1):
-            if edges:
-                _, i, j = edges.pop(0)
-                mst[i, j] = 0
-                mst[j, i] = 0  # Ensure symmetry
+    def select_n_clusters(self, data):
+        """
+        Number of clusters for the dataset (at most max_clusters) with the configured k_selection:
+        'gap' and 'inconsistency' read the statistics of the cached MST edges, 'silhouette' runs
+        the KMeans silhouette sweep.
+        """
+        if self.k_selection == "silhouette":
+            kmeans_analysis = KMeansAnalysis(max_clusters=self.max_clusters, silhouette_mode=self.silhouette_mode)
+            return kmeans_analysis.silhouette_method(data)
+
+        tree = self.spanning_tree(data)
+        if self.k_selection == "gap":
+            n_clusters, _ = gap_n_clusters(tree["weights"], self.max_clusters)
+        elif self.k_selection == "inconsistency":
+            n_clusters, _ = inconsistency_n_clusters(tree["linkage"], self.max_clusters)
+        else:
+            raise ValueError(f"Unknown k_selection '{self.k_selection}'. "
+                             f"Use 'gap', 'inconsistency' or 'silhouette'.")
+        return n_clusters
 
-        # Assign clusters using connected components
-        n_components, labels = connected_components(csgraph=mst, directed=False)
+    def run_kruskal(self, data, n_clusters):
+        """
+        Perform Kruskal-based clustering.
+        """
+        # Remove the longest n_clusters - 1 edges and assign clusters using connected components
+        labels, n_components = self.labels_for_k(data, n_clusters)
 
         data['label_cluster'] = labels
         return data, n_components
 
     def perform_clustering(self, data):
         """
-        Determine the optimal number of clusters using KMeans silhouette method,
-        and perform Kruskal clustering with a cap on the maximum number of clusters.
+        Determine the optimal number of clusters (MST edge statistics or KMeans silhouette method,
+        see k_selection), and perform Kruskal clustering with a cap on the maximum number of clusters.
         """
-        # Use KMeans silhouette method to find the optimal number of clusters
-        kmeans_analysis = KMeansAnalysis(max_clusters=self.max_clusters)
-        optimal_clusters = kmeans_analysis.silhouette_method(data)
+        # Con coreset_ratio l'MST si costruisce sui rappresentanti: gli archi cambiano al più di 2δ
+        compressed = self._compress(data)
+
+        optimal_clusters = self.select_n_clusters(compressed)
 
-        print(f"Optimal number of clusters (Silhouette Method): {optimal_clusters}")
+        print(f"Optimal number of clusters ({self.k_selection} method): {optimal_clusters}")
 
         # Cap the number of clusters at the maximum allowed value
         capped_clusters = min(optimal_clusters, self.n_clusters)
@@ -63,7 +125,8 @@ class KruskalClustering(ClusterAnalysis):
         print(f"Using {capped_clusters} clusters for Kruskal's Clustering (Capped at {self.n_clusters}).")
 
         # Perform Kruskal clustering
-        clustered_data, n_components = self.run_kruskal(data, capped_clusters)
+        compressed, n_components = self.run_kruskal(compressed, capped_clusters)
+        clustered_data = self._expand(data, compressed)
 
         print(f"Kruskal's Clustering formed {n_components} clusters.")
 
@@ -73,30 +136,35 @@ class KruskalClustering(ClusterAnalysis):
 
         return clustered_data
 
-    def visualize_mst(self, data):
+    def visualize_mst(self, data, max_edges=20000):
         """
         Visualize the Minimum Spanning Tree (MST).
+        All edges are drawn in a single LineCollection; with more than max_edges edges only the
+        longest max_edges are drawn (the ones that decide the clusters). max_edges=None draws all.
         """
-        # Compute pairwise distance matrix
-        dist_matrix = distance_matrix(data[['x', 'y']], data[['x', 'y']])
+        if not self.cluster_env.plots_enabled:
+            return
 
-        # Build the MST
-        mst = minimum_spanning_tree(dist_matrix).toarray()
+        tree = self.spanning_tree(data)
+        rows, cols = tree["rows"], tree["cols"]
+        # Gli archi sono in ordine di fusione: i più lunghi sono in fondo
+        if max_edges is not None and len(rows) > max_edges:
+            rows, cols = rows[len(rows) - max_edges:], cols[len(cols) - max_edges:]
+        coordinates = data[['x', 'y']].to_numpy(dtype=np.float64)
 
         # Plot the points
-        plt.figure(figsize=(10, 6))
-        plt.scatter(data['x'], data['y'], c='blue', label="Data Points")
-        plt.title("Minimum Spanning Tree (MST)")
+        fig = plt.figure(figsize=(10, 6))
+        plt.scatter(coordinates[:, 0], coordinates[:, 1], c='blue', label="Data Points")
+        title = "Minimum Spanning Tree (MST)"
+        if len(rows) < len(tree["rows"]):
+            title += f" - longest {len(rows)} of {len(tree['rows'])} edges"
+        plt.title(title)
         plt.xlabel("X Coordinate")
         plt.ylabel("Y Coordinate")
 
-        # Plot the edges of the MST
-        for i in range(len(mst)):
-            for j in range(len(mst)):
-                if mst[i, j] > 0:
-                    plt.plot([data.iloc[i]['x'], data.iloc[j]['x']],
-                             [data.iloc[i]['y'], data.iloc[j]['y']],
-                             color='red', linestyle='--')
+        # Plot the edges of the MST (segmenti n_edges x 2 x 2, una sola chiamata)
+        segments = np.stack([coordinates[rows], coordinates[cols]], axis=1)
+        plt.gca().add_collection(LineCollection(segments, colors='red', linestyles='--', label="MST Edges"))
 
         plt.legend()
-        plt.show()
\ No newline at end of file
+        self.cluster_env.render(fig, "Minimum Spanning Tree (MST)")
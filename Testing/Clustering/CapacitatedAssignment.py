@@ -0,0 +1,279 @@
+import numpy as np
+
+
+def capacitated_assign(costs, capacities, prices=None, tau_start=None, repair_limit=0.01, sweeps=2):
+    """
+    Assign every point to one cluster minimising sum(costs[i, labels[i]]) with at most
+    capacities[j] points in cluster j (the min-cost flow / transportation problem).
+
+    The LP is solved in its dual, one price per cluster (k variables instead of n x k), with
+    entropic smoothing and decreasing temperature. Each point then goes to the cluster
+    with the lowest cost + price; points left on overloaded clusters are moved along shortest
+    paths of the k-node cluster graph and the remaining negative cycles of that graph are
+    cancelled, so the final assignment is optimal.
+
+    Passing the prices of a previous call warm-starts it, e.g. between two Lloyd iterations: the
+    prices are first moved by `sweeps` rounds of balance_prices; if at the new prices at most
+    repair_limit * n points exceed the capacities, the smoothed dual is skipped and the
+    assignment is repaired directly, otherwise the dual restarts from them (at the lower
+    tau_start).
+
+    Returns (labels, prices), the prices being optimal dual prices of the returned assignment.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    n_points, n_clusters = costs.shape
+    capacities = np.broadcast_to(np.asarray(capacities, dtype=np.int64), (n_clusters,))
+    if capacities.sum() < n_points:
+        raise ValueError(f"Total capacity {capacities.sum()} is below the number of points {n_points}.")
+
+    if prices is not None:
+        prices = balance_prices(costs, capacities, prices, sweeps)
+        labels = np.argmin(costs + prices, axis=1)
+        excess = np.maximum(np.bincount(labels, minlength=n_clusters) - capacities, 0).sum()
+        # Prezzi ancora quasi giusti: la riparazione costa meno di un nuovo passaggio sul duale n x k
+        if excess <= repair_limit * n_points:
+            return optimise_assignment(costs, labels, capacities)
+
+    prices = dual_prices(costs, capacities, prices=prices, tau_start=tau_start)
+    return optimise_assignment(costs, np.argmin(costs + prices, axis=1), capacities)
+
+
+def balance_prices(costs, capacities, prices, sweeps=2):
+    """
+    Exact coordinate ascent on the (unsmoothed) dual: each cluster price in turn is set to the
+    lowest value >= 0 at which the cluster holds no more than its capacity, given the other
+    prices, i.e. to the (capacity + 1)-th smallest gap between the cluster cost and the cheapest
+    other cluster. Cheap (O(n) per cluster, the two cheapest clusters of every point are kept up
+    to date) and, from the prices of the previous Lloyd iteration, enough to leave only a few
+    points for optimise_assignment to move.
+    """
+    n_points, n_clusters = costs.shape
+    prices = np.asarray(prices, dtype=np.float64).copy()
+    if n_clusters < 2:
+        return prices
+    # Una riga per cluster: gli aggiornamenti di un prezzo toccano memoria contigua
+    reduced = costs.T + prices[:, None]
+    first, first_value, second, second_value = _two_cheapest(reduced)
+
+    for _ in range(sweeps):
+        changed = False
+        for cluster, capacity in enumerate(capacities):
+            if capacity >= n_points:
+                price = 0.0
+            else:
+                gaps = reduced[cluster] - np.where(first == cluster, second_value, first_value)
+                price = max(0.0, prices[cluster] - np.partition(gaps, capacity)[capacity])
+            if price == prices[cluster]:
+                continue
+            changed = True
+            step = price - prices[cluster]
+            reduced[cluster] += step
+            prices[cluster] = price
+            # Prezzo salito: cambiano solo i punti che avevano il cluster tra i due più economici;
+            # prezzo sceso: solo quelli per cui ora è più economico del secondo
+            rows = np.flatnonzero((first == cluster) | (second == cluster)) if step > 0 \
+                else np.flatnonzero(reduced[cluster] < second_value)
+            first[rows], first_value[rows], second[rows], second_value[rows] = _two_cheapest(reduced[:, rows])
+        if not changed:
+            break
+    return prices
+
+
+def dual_prices(costs, capacities, prices=None, tau_start=None, tau_end=1e-5, cooling=4.0,
+                max_iter=20, tolerance=0.5):
+    """
+    Cluster prices of the entropy-regularised capacitated transport problem.
+
+    The smoothed dual is concave in the k prices, with gradient (loads - capacities) and
+    Hessian -(diag(loads) - S^T S) / tau, S being the n x k matrix of soft assignments, so
+    every temperature level is solved by a few projected Newton steps (prices >= 0) with
+    backtracking. The temperature goes from tau_start (default 1/10 of the cost range) down to
+    tau_end times the cost range, dividing by `cooling` at each level; a level stops when every
+    active cluster is within `tolerance` points of its capacity.
+    The prices only need to be close: optimise_assignment makes the rounding exact.
+    """
+    n_clusters = costs.shape[1]
+    capacities = capacities.astype(np.float64)
+    scale = max(np.ptp(costs), 1e-12)
+    prices = np.zeros(n_clusters) if prices is None else np.asarray(prices, dtype=np.float64).copy()
+    tau = scale / 10 if tau_start is None else max(tau_start, scale * tau_end)
+
+    while True:
+        value, log_shares = _smoothed_dual(costs, prices, capacities, tau)
+        for _ in range(max_iter):
+            shares = np.exp(log_shares)
+            loads = shares.sum(axis=0)
+            gradient = loads - capacities
+            # Cluster attivi: prezzo positivo, oppure in eccesso (il prezzo deve salire)
+            free = (prices > 0) | (gradient > 0)
+            if np.all(np.abs(gradient[free]) < tolerance):
+                break
+
+            hessian = ((np.diag(loads) - shares.T @ shares) / tau)[np.ix_(free, free)]
+            # La hessiana è singolare lungo il vettore di tutti 1: una piccola regolarizzazione
+            hessian += (1e-9 * np.trace(hessian) / len(hessian) + 1e-12) * np.eye(len(hessian))
+            direction = np.zeros(n_clusters)
+            direction[free] = np.linalg.solve(hessian, gradient[free])
+
+            step = 1.0
+            while step >= 1e-3:
+                candidate = np.maximum(prices + step * direction, 0.0)
+                candidate_value, candidate_shares = _smoothed_dual(costs, candidate, capacities, tau)
+                if candidate_value >= value + 1e-4 * gradient @ (candidate - prices):
+                    break
+                step /= 2
+            if step < 1e-3:
+                # Nessun progresso (carichi a gradini per punti coincidenti): si passa al livello successivo
+                break
+            prices, value, log_shares = candidate, candidate_value, candidate_shares
+
+        if tau <= scale * tau_end:
+            return prices
+        tau = max(tau / cooling, scale * tau_end)
+
+
+def optimise_assignment(costs, labels, capacities):
+    """
+    Turn an assignment into the optimal one for the given capacities, working on the k x k
+    cluster graph whose edge a -> b is the cheapest single point moving from a to b (or a free
+    slot of a, at cost 0, if a is below capacity):
+    - overloaded clusters are emptied along the cheapest chain towards a cluster with room
+      (successive shortest paths);
+    - negative cycles are cancelled until none is left, which is the optimality condition of
+      the transportation problem.
+    Each step moves one point per edge and updates only the edges of the points it moved.
+
+    Returns (labels, prices): the shortest-path potentials of the final cluster graph are
+    optimal dual prices (every point sits in its cheapest cluster at cost + price, and the
+    clusters below capacity have price 0), ready to warm-start the next call.
+    """
+    n_points, n_clusters = costs.shape
+    labels = labels.copy()
+    loads = np.bincount(labels, minlength=n_clusters)
+    members = np.split(np.argsort(labels, kind="stable"), np.cumsum(loads)[:-1])
+    # Costo di spostare ciascun punto in ciascun cluster, rispetto al cluster attuale
+    delta = costs - costs[np.arange(n_points), labels][:, None]
+    point_costs = np.full((n_clusters, n_clusters), np.inf)
+    movers = np.zeros((n_clusters, n_clusters), dtype=np.int64)
+    for cluster in range(n_clusters):
+        _update_movers(cluster, np.arange(n_clusters), members[cluster], delta, point_costs, movers)
+
+    while True:
+        edge_costs = point_costs.copy()
+        edge_costs[loads < capacities] = np.minimum(edge_costs[loads < capacities], 0.0)
+        np.fill_diagonal(edge_costs, np.inf)
+
+        # Prima i cicli negativi (che non cambiano i carichi), poi una catena dal cluster in eccesso:
+        # senza cicli negativi i cammini minimi sono ben definiti
+        distance, chain = _bellman_ford(edge_costs, np.zeros(n_clusters), detect_cycle=True)
+        if chain is None:
+            overloaded = loads > capacities
+            if not overloaded.any():
+                return labels, distance.max() - distance
+            distance, previous = _bellman_ford(edge_costs, np.where(overloaded, 0.0, np.inf))
+            chain = _trace(previous, int(np.argmin(np.where(loads < capacities, distance, np.inf))), overloaded)
+
+        for source, destination in chain:
+            # Un arco a costo 0 da un cluster non pieno sposta solo un posto libero
+            if point_costs[source, destination] > edge_costs[source, destination]:
+                continue
+            point = movers[source, destination]
+            labels[point] = destination
+            delta[point] = costs[point] - costs[point, destination]
+            loads[source] -= 1
+            loads[destination] += 1
+            members[source] = members[source][members[source] != point]
+            members[destination] = np.append(members[destination], point)
+            # Il punto entra in destination: basta confrontarlo con i candidati attuali
+            better = delta[point] < point_costs[destination]
+            point_costs[destination, better] = delta[point, better]
+            movers[destination, better] = point
+            # Esce da source: si ricalcolano solo le destinazioni di cui era il punto più economico
+            _update_movers(source, np.flatnonzero(movers[source] == point), members[source], delta, point_costs,
+                           movers)
+
+
+def _update_movers(cluster, destinations, members, delta, point_costs, movers):
+    # Punto più economico da spostare da `cluster` verso ciascuna delle destinazioni indicate
+    if not len(destinations):
+        return
+    if not len(members):
+        point_costs[cluster, destinations] = np.inf
+        return
+    best = np.argmin(delta[np.ix_(members, destinations)], axis=0)
+    point_costs[cluster, destinations] = delta[members[best], destinations]
+    movers[cluster, destinations] = members[best]
+
+
+def _bellman_ford(edge_costs, distance, detect_cycle=False):
+    # Bellman-Ford vettorizzato sui k nodi; con detect_cycle restituisce un ciclo negativo (o None)
+    n_nodes = len(distance)
+    distance = distance.copy()
+    previous = np.full(n_nodes, -1)
+    for _ in range(n_nodes if detect_cycle else n_nodes - 1):
+        candidates = distance[:, None] + edge_costs
+        source = np.argmin(candidates, axis=0)
+        relaxed = candidates[source, np.arange(n_nodes)]
+        better = relaxed < distance - 1e-9
+        if not better.any():
+            return distance, (None if detect_cycle else previous)
+        distance[better] = relaxed[better]
+        previous[better] = source[better]
+        if detect_cycle:
+            # Un ciclo nel grafo dei predecessori è già un ciclo negativo: non serve arrivare a n passi
+            node = _predecessor_cycle(previous)
+            if node is not None:
+                return distance, _cycle(previous, node)
+    if not detect_cycle:
+        return distance, previous
+
+    # Dopo n rilassamenti un nodo ancora migliorato porta, risalendo n passi, dentro un ciclo negativo
+    node = int(np.flatnonzero(better)[0])
+    for _ in range(n_nodes):
+        node = previous[node]
+    return distance, _cycle(previous, node)
+
+
+def _predecessor_cycle(previous):
+    # Salti raddoppiati sui predecessori (-1 resta -1): dopo >= n salti si è alla radice o dentro un ciclo
+    jump = np.append(previous, -1)
+    for _ in range(int(np.ceil(np.log2(len(previous)))) + 1):
+        jump = jump[jump]
+    on_cycle = np.flatnonzero(jump[:-1] >= 0)
+    return int(jump[on_cycle[0]]) if len(on_cycle) else None
+
+
+def _cycle(previous, node):
+    cycle, current = [], node
+    while True:
+        cycle.append((previous[current], current))
+        current = previous[current]
+        if current == node:
+            return cycle
+
+
+def _trace(previous, target, stop):
+    chain, node = [], target
+    while not stop[node]:
+        chain.append((previous[node], node))
+        node = previous[node]
+    return chain
+
+
+def _two_cheapest(reduced):
+    # Per ogni colonna (punto) indici e valori dei due cluster più economici
+    columns = np.arange(reduced.shape[1])
+    first = np.argmin(reduced, axis=0)
+    first_value = reduced[first, columns]
+    reduced = reduced.copy()
+    reduced[first, columns] = np.inf
+    second = np.argmin(reduced, axis=0)
+    return first, first_value, second, reduced[second, columns]
+
+
+def _smoothed_dual(costs, prices, capacities, tau):
+    # Valore del duale regolarizzato e logaritmo delle assegnazioni soft (softmin per riga)
+    reduced = -(costs + prices) / tau
+    peak = reduced.max(axis=1, keepdims=True)
+    log_norm = np.log(np.exp(reduced - peak).sum(axis=1, keepdims=True)) + peak
+    return -tau * log_norm.sum() - capacities @ prices, reduced - log_norm
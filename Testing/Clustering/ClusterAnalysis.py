@@ -1,10 +1,19 @@
 from abc import ABC, abstractmethod
-from sklearn.metrics import silhouette_score
+import numpy as np
+import pandas as pd
 import Testing.Dataset.random_points_generator as rpg
+from Testing.Clustering.Silhouette import estimate_silhouette
+from Testing.Clustering.Coreset import grid_coreset, expand_labels, describe_coreset
 
 class ClusterAnalysis(ABC):
-    def __init__(self, n_clusters=3):
+    def __init__(self, n_clusters=3, silhouette_mode="sklearn", silhouette_sample_size=10000, coreset_ratio=None):
         self.n_clusters = n_clusters
+        self.silhouette_mode = silhouette_mode  # 'sklearn', 'exact' (streamed blocks) or 'sampled' (stratified)
+        self.silhouette_sample_size = silhouette_sample_size
+        self.silhouette_ci = None  # Confidence interval of the last silhouette estimate
+        # Cluster a weighted grid coreset of about coreset_ratio * n points instead of every row (None = off)
+        self.coreset_ratio = coreset_ratio
+        self.coreset = None  # Coreset (and error bounds) of the last compressed run
 
     @abstractmethod
     def perform_clustering(self, data, n_clusters=None):
@@ -35,7 +44,48 @@ class ClusterAnalysis(ABC):
         Calculate silhouette score for the clustering results.
         """
         if len(set(data['label_cluster'])) > 1:
-            silhouette_avg = silhouette_score(data[['x', 'y']], data['label_cluster'])
+            silhouette_avg = self._silhouette(data[['x', 'y']], data['label_cluster'], weights=self._sample_weight(data))
             print(f"Silhouette Score: {silhouette_avg:.2f}")
         else:
             print("Silhouette Score: Not available (less than 2 clusters)")
+
+    def _silhouette(self, coordinates, labels, mode=None, weights=None):
+        """
+        Silhouette score computed with the estimator selected by silhouette_mode (or `mode`).
+        The confidence interval of the estimate is kept in self.silhouette_ci.
+        """
+        mode = mode if mode else self.silhouette_mode
+        silhouette_avg, self.silhouette_ci = estimate_silhouette(
+            coordinates, labels, mode=mode, sample_size=self.silhouette_sample_size, weights=weights
+        )
+        if mode == "sampled" and weights is None:
+            print(f"Silhouette 95% confidence interval: [{self.silhouette_ci[0]:.3f}, {self.silhouette_ci[1]:.3f}]")
+        return silhouette_avg
+
+    def _compress(self, data, max_cell_size=None):
+        """
+        Weighted grid coreset of `data` as a DataFrame with x, y and a 'weight' column (the number
+        of rows each representative replaces), with cells no larger than max_cell_size. Returns
+        `data` itself when coreset_ratio is not set.
+        """
+        if not self.coreset_ratio:
+            self.coreset = None
+            return data
+        self.coreset = grid_coreset(data[['x', 'y']].to_numpy(dtype=np.float64), target_ratio=self.coreset_ratio,
+                                    max_cell_size=max_cell_size)
+        print(describe_coreset(self.coreset))
+        return pd.DataFrame({'x': self.coreset['points'][:, 0], 'y': self.coreset['points'][:, 1],
+                             'weight': self.coreset['weights']})
+
+    def _expand(self, data, compressed):
+        """
+        Copy the labels computed on the coreset back to the original rows of `data`.
+        """
+        if compressed is not data:
+            data['label_cluster'] = expand_labels(self.coreset, compressed['label_cluster'].to_numpy())
+        return data
+
+    @staticmethod
+    def _sample_weight(data):
+        # Pesi dei rappresentanti del coreset (None sui dati originali)
+        return data['weight'].to_numpy(dtype=np.float64) if 'weight' in data.columns else None
@@ -0,0 +1,86 @@
+import numpy as np
+
+
+def grid_coreset(coordinates, cell_size=None, target_ratio=0.1, max_cell_size=None):
+    """
+    Collapse the points into a weighted coreset by snapping them to a square grid: every
+    occupied cell becomes one representative (the mean of its points) whose weight is the number
+    of points it replaces. With cell_size None the cell is chosen so that about
+    target_ratio * n representatives are left, but never larger than max_cell_size (e.g.
+    eps / sqrt(2) for DBSCAN, so that the points merged into one representative are eps-neighbours).
+
+    Returns a dict with the representatives ('points'), their 'weights', the 'inverse' index
+    mapping every original row to its representative, and the error bounds:
+    - 'max_displacement' (δ): no point moves by more than δ, so every pairwise distance (MST
+      edges, silhouette terms, DBSCAN neighbourhoods) changes by at most 2δ;
+    - 'quantization_sse': for labels that are constant on each cell, the k-means cost on the
+      original rows is exactly the weighted coreset cost plus this value;
+    - 'relative_error': quantization_sse over the total SSE of the data.
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    if cell_size is None:
+        cell_size = choose_cell_size(coordinates, target_ratio)
+        if max_cell_size is not None:
+            cell_size = min(cell_size, max_cell_size)
+
+    _, inverse = np.unique(_cell_keys(coordinates, cell_size), return_inverse=True)
+    inverse = inverse.ravel()
+    weights = np.bincount(inverse).astype(np.float64)
+    points = np.column_stack([np.bincount(inverse, weights=axis) for axis in coordinates.T]) / weights[:, None]
+
+    offsets = coordinates - points[inverse]
+    squared = np.sum(offsets ** 2, axis=1)
+    total_sse = np.sum((coordinates - coordinates.mean(axis=0)) ** 2)
+    return {
+        "points": points,
+        "weights": weights,
+        "inverse": inverse,
+        "cell_size": float(cell_size),
+        "max_displacement": float(np.sqrt(squared.max())) if len(squared) else 0.0,
+        "quantization_sse": float(squared.sum()),
+        "relative_error": float(squared.sum() / total_sse) if total_sse > 0 else 0.0,
+    }
+
+
+def choose_cell_size(coordinates, target_ratio=0.1, n_steps=30):
+    """
+    Smallest grid cell (found by bisection on a log scale) leaving at most target_ratio * n
+    occupied cells.
+    """
+    target = max(1, int(np.ceil(target_ratio * len(coordinates))))
+    extent = float(np.ptp(coordinates, axis=0).max()) if len(coordinates) else 0.0
+    if extent == 0.0:
+        return 1.0
+
+    low, high = np.log(extent * 1e-6), np.log(extent * 2)
+    for _ in range(n_steps):
+        middle = (low + high) / 2
+        if len(np.unique(_cell_keys(coordinates, np.exp(middle)))) > target:
+            low = middle
+        else:
+            high = middle
+    return float(np.exp(high))
+
+
+def expand_labels(coreset, labels):
+    """
+    Labels of the original rows from the labels of the coreset representatives.
+    """
+    return np.asarray(labels)[coreset["inverse"]]
+
+
+def describe_coreset(coreset):
+    return (f"Coreset: {len(coreset['inverse'])} -> {len(coreset['points'])} points "
+            f"(cell {coreset['cell_size']:.3g}); max displacement {coreset['max_displacement']:.3g} "
+            f"(distances within ±{2 * coreset['max_displacement']:.3g}), "
+            f"quantization SSE {coreset['relative_error']:.2%} of the total")
+
+
+def _cell_keys(coordinates, cell_size):
+    # Indici di cella (interi) fusi in un'unica chiave int64 per riga
+    cells = np.floor((coordinates - coordinates.min(axis=0)) / cell_size).astype(np.int64)
+    span = cells.max(axis=0) + 1
+    keys = cells[:, 0]
+    for axis in range(1, cells.shape[1]):
+        keys = keys * span[axis] + cells[:, axis]
+    return keys
@@ -0,0 +1,160 @@
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import minimum_spanning_tree
+from Testing.Clustering.GridDBSCAN import build_grid, neighbour_cells, within_pairs
+from Testing.Clustering.KDistance import nearest_neighbours, core_from_neighbours
+from Testing.Clustering.EMST import forest_labels
+
+# Cella stessa più le celle "in avanti": ogni coppia di celle vicine si visita una volta sola
+_FORWARD = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3) if (dx, dy) >= (0, 0)]
+
+
+def reachability_forest(points, min_samples, max_eps, sample_weight=None, max_pairs=2 ** 22):
+    """
+    Compute once the density structure from which DBSCAN can be extracted for any eps <= max_eps.
+
+    - core distances (squared) from one batched KD-tree query of the k = ceil(min_samples)
+      nearest neighbours, whose table is kept: a non-core point has fewer than min_samples
+      neighbours within eps, so they are all in its row (weights must be >= 1, as coreset
+      weights are);
+    - the minimum spanning forest of the mutual reachability distance max(core(a), core(b),
+      d(a, b)) over the pairs within max_eps, the graph behind the OPTICS reachability plot:
+      for a given eps, the core points (core <= eps) joined by forest edges <= eps are exactly
+      the DBSCAN clusters.
+
+    The forest is built by radius levels doubling up to max_eps: a level only looks at the pairs
+    farther apart than the previous radius, and drops those whose points are already joined by
+    lighter edges (they cannot enter the forest); grid cell pairs whose points all lie in one
+    component are skipped without expanding them. Candidate pairs are streamed in chunks of
+    max_pairs, so memory stays O(n + max_pairs).
+
+    All the distances are squared and computed as dx^2 + dy^2, the DBSCAN test.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    n_points = len(points)
+    k = min(int(np.ceil(min_samples)), n_points)
+    neighbours, distances = nearest_neighbours(points, k)
+    core = core_from_neighbours(neighbours, distances, min_samples, sample_weight)
+
+    # Solo i punti core entro max_eps possono stare nella foresta
+    candidates = np.flatnonzero(core <= max_eps * max_eps)
+    candidate_points, candidate_core = points[candidates], core[candidates]
+    n_candidates = len(candidates)
+    rows, cols, weights = np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+    if n_candidates == 0:
+        # Nessun core point entro max_eps: foresta vuota, ogni eps dà solo rumore
+        return {"core": core, "neighbours": neighbours, "distances": distances, "max_eps": max_eps,
+                "rows": rows, "cols": cols, "weights": weights}
+
+    previous = -1.0  # Quadrato del raggio precedente (-1: al primo livello passano anche i punti coincidenti)
+    for radius in _radius_levels(candidate_core, max_eps):
+        # Componenti degli archi più leggeri di ogni coppia di questo livello (peso <= previous)
+        n_edges = int(np.searchsorted(weights, previous, side="right"))
+        _, component = forest_labels(n_candidates, rows, cols, n_edges)
+
+        grid = build_grid(candidate_points, radius)
+        order, starts, counts = grid["order"], grid["starts"], grid["counts"]
+        sorted_points, sorted_core, sorted_component = candidate_points[order], candidate_core[order], component[order]
+        low, high = np.minimum.reduceat(sorted_component, starts), np.maximum.reduceat(sorted_component, starts)
+        source, target = neighbour_cells(grid, _FORWARD)
+        # Celle con tutti i punti nella stessa componente: nessuna coppia tra loro può servire
+        useful = ~((low[source] == high[source]) & (low[target] == high[target]) & (low[source] == low[target]))
+        source, target = source[useful], target[useful]
+
+        buffered, n_buffered = [], 0
+        for a, b, _ in within_pairs(sorted_points, radius, starts[source], counts[source],
+                                    starts[target], counts[target], max_pairs):
+            # Le celle in avanti seguono sempre la cella di partenza nell'ordine: a < b prende ogni coppia una volta
+            keep = (a < b) & (sorted_component[a] != sorted_component[b])
+            a, b = a[keep], b[keep]
+            offsets = sorted_points[a] - sorted_points[b]
+            squared = offsets[:, 0] * offsets[:, 0] + offsets[:, 1] * offsets[:, 1]
+            farther = squared > previous  # Le coppie più vicine sono già state viste
+            a, b, squared = a[farther], b[farther], squared[farther]
+            buffered.append((order[a], order[b], np.maximum(np.maximum(sorted_core[a], sorted_core[b]), squared)))
+            n_buffered += len(a)
+            if n_buffered >= max_pairs:
+                rows, cols, weights = _reduce_forest(n_candidates, rows, cols, weights, buffered)
+                buffered, n_buffered = [], 0
+        rows, cols, weights = _reduce_forest(n_candidates, rows, cols, weights, buffered)
+        previous = radius * radius
+
+    return {"core": core, "neighbours": neighbours, "distances": distances, "max_eps": max_eps,
+            "rows": candidates[rows], "cols": candidates[cols], "weights": weights}
+
+
+def _radius_levels(core, max_eps):
+    # Raggi che raddoppiano fino a max_eps, partendo circa dalla distanza core mediana
+    if len(core) == 0:
+        return [max_eps]
+    start = max(np.sqrt(np.median(core)), max_eps / 2 ** 16)
+    n_levels = max(0, int(np.ceil(np.log2(max_eps / start)))) if start > 0 else 0
+    return [max_eps / 2 ** level for level in range(n_levels, -1, -1)]
+
+
+def _reduce_forest(n_points, rows, cols, weights, buffered):
+    # Minimum spanning forest della foresta corrente più le nuove coppie (al più n - 1 archi)
+    rows = np.concatenate([rows] + [chunk[0] for chunk in buffered])
+    cols = np.concatenate([cols] + [chunk[1] for chunk in buffered])
+    weights = np.concatenate([weights] + [chunk[2] for chunk in buffered])
+    if len(rows) == 0:
+        return rows, cols, weights
+    # scipy ignora gli archi di peso 0 (punti coincidenti): si sostituiscono con il più piccolo positivo
+    tiny = np.nextafter(0, 1)
+    graph = coo_matrix((np.maximum(weights, tiny), (rows, cols)), shape=(n_points, n_points)).tocsr()
+    forest = minimum_spanning_tree(graph).tocoo()
+    # Archi in ordine crescente: per ogni soglia basta un prefisso
+    by_weight = np.argsort(forest.data, kind="stable")
+    forest_weights = np.where(forest.data == tiny, 0.0, forest.data)[by_weight]
+    return forest.row.astype(np.intp)[by_weight], forest.col.astype(np.intp)[by_weight], forest_weights
+
+
+def extract_dbscan(forest, eps):
+    """
+    DBSCAN labels and core mask for `eps` (<= max_eps) from a reachability_forest, in O(n):
+    the same labels as DBSCAN / GridDBSCAN, noise (-1) included.
+    """
+    if eps > forest["max_eps"]:
+        raise ValueError(f"eps={eps} is above the max_eps={forest['max_eps']} of the forest.")
+    eps_squared = eps * eps
+    core = forest["core"] <= eps_squared
+    n_points = len(core)
+    n_edges = int(np.searchsorted(forest["weights"], eps_squared, side="right"))
+    _, component = forest_labels(n_points, forest["rows"], forest["cols"], n_edges)
+
+    # Cluster numerati per indice minimo dei core point, come nell'ordine di visita di DBSCAN
+    core_index = np.flatnonzero(core)
+    first = np.full(n_points, n_points)
+    np.minimum.at(first, component[core_index], core_index)
+    used = np.flatnonzero(first < n_points)
+    component_label = np.full(n_points, -1, dtype=np.intp)
+    component_label[used[np.argsort(first[used])]] = np.arange(len(used))
+    labels = np.where(core, component_label[component], -1)
+
+    # Bordi: l'etichetta più bassa tra i core vicini entro eps, tutti nella riga dei k vicini
+    border = np.flatnonzero(~core)
+    neighbours = forest["neighbours"][border]
+    reachable = (forest["distances"][border] <= eps_squared) & core[neighbours]
+    candidates = np.where(reachable, labels[neighbours], n_points).min(axis=1)
+    labels[border] = np.where(candidates < n_points, candidates, -1)
+    return labels, core
+
+
+def sweep_eps(points, eps_values, min_samples, sample_weight=None, max_pairs=2 ** 22):
+    """
+    DBSCAN for every eps in `eps_values` from a single reachability_forest (built up to the
+    largest eps). Returns {eps: {"labels", "noise_fraction", "n_clusters"}}, the noise fraction
+    weighted by sample_weight when given.
+    """
+    eps_values = sorted(set(float(eps) for eps in eps_values))
+    forest = reachability_forest(points, min_samples, eps_values[-1], sample_weight, max_pairs)
+    weights = np.ones(len(forest["core"])) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+    results = {}
+    for eps in eps_values:
+        labels, _ = extract_dbscan(forest, eps)
+        results[eps] = {
+            "labels": labels,
+            "noise_fraction": float(weights[labels == -1].sum() / weights.sum()) if len(labels) else 0.0,
+            "n_clusters": int(labels.max()) + 1 if len(labels) else 0,
+        }
+    return results
@@ -0,0 +1,156 @@
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import minimum_spanning_tree, connected_components
+from scipy.spatial import Delaunay, QhullError
+from scipy.cluster.hierarchy import inconsistent
+
+
+def euclidean_mst(coordinates):
+    """
+    Euclidean minimum spanning tree of 2D points, computed on the Delaunay triangulation (which
+    contains every EMST edge): O(n log n) time and O(n) memory instead of the n x n distance matrix.
+
+    Returns the n - 1 tree edges as three arrays (rows, cols, weights) with rows < cols.
+    As in the dense path, where a zero distance is no edge, every extra copy of a coincident
+    point hangs from the nearest distinct point of its first copy, so the labels match the dense
+    MST; only when all points coincide are the copies joined by zero-length edges.
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    n_points = len(coordinates)
+    if n_points < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+
+    # I duplicati vengono tolti prima della triangolazione e riattaccati dopo
+    order = np.lexsort(coordinates.T[::-1])
+    starts = np.concatenate([[True], np.any(np.diff(coordinates[order], axis=0) != 0, axis=1)])
+    inverse = np.empty(n_points, dtype=np.int64)
+    inverse[order] = np.cumsum(starts) - 1
+    first = order[starts]  # Ordinamento stabile: il primo di ogni gruppo è la copia con indice minore
+    rows, cols = _unique_tree(coordinates[first])
+    anchors = np.arange(len(first))
+    if len(rows):
+        # Vicino distinto più prossimo di ogni punto: l'arco più corto che lo tocca nell'MST
+        ends, others = np.concatenate([rows, cols]), np.concatenate([cols, rows])
+        lengths = np.linalg.norm(coordinates[first[ends]] - coordinates[first[others]], axis=1)
+        order = np.lexsort((lengths, ends))
+        nearest = np.concatenate([[True], np.diff(ends[order]) != 0])
+        anchors[ends[order][nearest]] = others[order][nearest]
+    rows, cols = first[rows], first[cols]
+
+    duplicates = np.flatnonzero(first[inverse] != np.arange(n_points))
+    rows = np.concatenate([rows, first[anchors[inverse[duplicates]]]])
+    cols = np.concatenate([cols, duplicates])
+
+    rows, cols = np.minimum(rows, cols), np.maximum(rows, cols)
+    weights = np.linalg.norm(coordinates[rows] - coordinates[cols], axis=1)
+    return rows, cols, weights
+
+
+def _unique_tree(points):
+    # MST di punti distinti, come coppie di indici
+    n_points = len(points)
+    if n_points < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    try:
+        simplices = Delaunay(points).simplices
+    except (QhullError, ValueError):
+        # Meno di 3 punti o tutti allineati: l'MST è la catena dei punti ordinati lungo la retta
+        direction = points[-1] - points[0]
+        order = np.argsort(points @ direction, kind="stable")
+        return order[:-1], order[1:]
+
+    # Archi dei triangoli, ciascuno una sola volta (chiave intera i * n + j con i < j)
+    edges = np.sort(np.vstack([simplices[:, [0, 1]], simplices[:, [1, 2]], simplices[:, [0, 2]]]), axis=1)
+    keys = np.unique(edges[:, 0].astype(np.int64) * n_points + edges[:, 1])
+    heads, tails = keys // n_points, keys % n_points
+    weights = np.linalg.norm(points[heads] - points[tails], axis=1)
+
+    graph = coo_matrix((weights, (heads, tails)), shape=(n_points, n_points)).tocsr()
+    tree = minimum_spanning_tree(graph).tocoo()
+    return tree.row.astype(np.int64), tree.col.astype(np.int64)
+
+
+def single_linkage(n_points, rows, cols, weights):
+    """
+    Single-linkage dendrogram of a spanning tree: the edges sorted in merge order (shortest
+    first; equal lengths in reverse row order, so cutting the last k - 1 edges matches the old
+    Kruskal cut) and the scipy-style linkage matrix built with union-find.
+
+    Returns (rows, cols, weights, linkage) with the edges in merge order.
+    """
+    order = np.lexsort((cols, rows, -weights))[::-1]
+    rows, cols, weights = rows[order], cols[order], weights[order]
+
+    # Liste Python: nel ciclo l'accesso elemento per elemento è molto più rapido che sugli array numpy
+    parent = list(range(n_points))
+    cluster_id = list(range(n_points))
+    size = [1] * n_points
+    linkage = np.empty((len(rows), 4))
+
+    def find(node):
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:  # Compressione del cammino
+            parent[node], node = root, parent[node]
+        return root
+
+    for step, (i, j, weight) in enumerate(zip(rows.tolist(), cols.tolist(), weights.tolist())):
+        root_i, root_j = find(i), find(j)
+        first, second = sorted((cluster_id[root_i], cluster_id[root_j]))
+        if size[root_i] < size[root_j]:
+            root_i, root_j = root_j, root_i
+        parent[root_j] = root_i
+        size[root_i] += size[root_j]
+        cluster_id[root_i] = n_points + step
+        linkage[step] = (first, second, weight, size[root_i])
+
+    return rows, cols, weights, linkage
+
+
+def forest_labels(n_points, rows, cols, n_edges):
+    """
+    Connected components of the forest made of the first `n_edges` edges: with the edges of
+    single_linkage this gives the n_points - n_edges single-linkage clusters in O(n).
+    Returns (n_components, labels).
+    """
+    n_edges = max(0, min(n_edges, len(rows)))
+    forest = coo_matrix((np.ones(n_edges), (rows[:n_edges], cols[:n_edges])), shape=(n_points, n_points))
+    return connected_components(csgraph=forest, directed=False)
+
+
+def gap_n_clusters(weights, max_clusters=10):
+    """
+    Number of clusters from the largest relative gap in the sorted MST edge lengths: k clusters
+    cut the k - 1 longest edges, scored by the shortest cut edge over the longest kept one.
+    `weights` are the edge lengths in merge order (ascending). O(k) after the MST sort.
+    Returns (n_clusters, scores) with scores[k] for every candidate k in 2..max_clusters.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    candidates = np.arange(2, min(max_clusters, len(weights)) + 1)
+    if len(candidates) == 0:
+        return 1, {}
+
+    # Arco più corto tagliato / arco più lungo mantenuto; le lunghezze nulle (duplicati) non dividono per 0
+    floor = max(weights[-1], 1.0) * 1e-12
+    ratios = weights[len(weights) - candidates + 1] / np.maximum(weights[len(weights) - candidates], floor)
+    scores = dict(zip(candidates.tolist(), ratios.tolist()))
+    return int(candidates[np.argmax(ratios)]), scores
+
+
+def inconsistency_n_clusters(linkage, max_clusters=10, depth=2):
+    """
+    Number of clusters from the inconsistency coefficients of the single-linkage dendrogram:
+    k clusters undo the top k - 1 merges, scored by the coefficient of the lowest undone merge
+    (its height against the links up to `depth` levels below it). O(n) for a small depth.
+    Returns (n_clusters, scores) with scores[k] for every candidate k in 2..max_clusters.
+    """
+    n_merges = len(linkage)
+    candidates = np.arange(2, min(max_clusters, n_merges) + 1)
+    if len(candidates) == 0:
+        return 1, {}
+
+    coefficients = inconsistent(linkage, depth)[:, 3]
+    values = coefficients[n_merges - candidates + 1]
+    scores = dict(zip(candidates.tolist(), values.tolist()))
+    return int(candidates[np.argmax(values)]), scores
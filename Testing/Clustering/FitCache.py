@@ -0,0 +1,135 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+import numpy as np
+
+
+class FitCache:
+    """
+    In-process LRU cache of clustering fits (labels, centroids, inertia, scores), keyed by a
+    fingerprint of the coordinate array plus the algorithm and its parameters.
+    Entries are evicted by total size; an optional on-disk tier keeps them across runs.
+    """
+    _shared = None
+
+    def __init__(self, max_bytes=256 * 2 ** 20, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @classmethod
+    def shared(cls):
+        """
+        Process-wide cache used by default by the analysis classes.
+        """
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    @staticmethod
+    def fingerprint(data):
+        """
+        Hash of the coordinate values and shape (the DataFrame index and column names do not matter).
+        """
+        data = np.ascontiguousarray(data, dtype=np.float64)
+        digest = hashlib.sha1(str(data.shape).encode())
+        digest.update(data.tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(fingerprint, algorithm, **params):
+        """
+        Cache key of a fit; numpy scalars count as the equal Python values (np.int64(5) and 5 give the same key).
+        """
+        params = {name: value.item() if isinstance(value, np.generic) else value for name, value in params.items()}
+        return f"{algorithm}-{fingerprint}-" + hashlib.sha1(repr(sorted(params.items())).encode()).hexdigest()[:16]
+
+    def get(self, key):
+        """
+        Return the cached result for `key` (memory first, then disk) or None.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        path = self._disk_path(key)
+        if path and os.path.exists(path):
+            with open(path, "rb") as file:
+                result = pickle.load(file)
+            self.hits += 1
+            self.disk_hits += 1
+            self._store(key, result)
+            return result
+
+        self.misses += 1
+        return None
+
+    def put(self, key, result):
+        """
+        Store a fit result (a dict of arrays and scalars) in memory and, if enabled, on disk.
+        """
+        self._store(key, result)
+        path = self._disk_path(key)
+        if path:
+            # Scrittura atomica: un file parziale non deve mai essere letto come valido
+            with open(path + ".tmp", "wb") as file:
+                pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + ".tmp", path)
+
+    def clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+        self._bytes = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "evictions": self.evictions,
+        }
+
+    def _store(self, key, result):
+        if key in self._entries:
+            self._bytes -= self._sizes.pop(key)
+            del self._entries[key]
+        size = _result_size(result)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = result
+        self._sizes[key] = size
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            evicted, _ = self._entries.popitem(last=False)
+            self._bytes -= self._sizes.pop(evicted)
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key + ".pkl") if self.disk_dir else None
+
+
+def _result_size(result):
+    # Dimensione approssimata: byte degli array più un costo fisso per ogni valore scalare
+    size = 0
+    for value in result.values():
+        if isinstance(value, np.ndarray):
+            size += value.nbytes
+        elif isinstance(value, dict):
+            size += _result_size(value)
+        else:
+            size += 64
+    return size
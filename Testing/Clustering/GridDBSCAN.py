@@ -0,0 +1,208 @@
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+# Celle vicine entro 2 passi: con lato eps / sqrt(2) due punti a distanza <= eps distano al più 2 celle
+_OFFSETS = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3) if (dx, dy) != (0, 0)]
+_FORWARD = [offset for offset in _OFFSETS if offset > (0, 0)]
+
+
+class GridDBSCAN:
+    """
+    DBSCAN specialised for 2D points: the points are bucketed into a uniform grid of cells with
+    side eps / sqrt(2), so that all the points of a cell are neighbours of each other, and the
+    neighbours of a point are searched only in the 24 surrounding cells. Core points are joined
+    cell by cell with connected components on the cell graph, giving near-linear time for
+    bounded density and memory bounded by max_pairs candidate pairs at a time.
+
+    Same interface as sklearn.cluster.DBSCAN (fit, fit_predict, labels_, core_sample_indices_)
+    and the same labels, noise (-1) included: a pair is within eps when dx^2 + dy^2 <= eps^2,
+    clusters are numbered by their lowest core point index, and a border point takes the lowest
+    label among the clusters of its core neighbours.
+    """
+
+    def __init__(self, eps=0.5, min_samples=5, max_pairs=2 ** 22):
+        self.eps = eps
+        self.min_samples = min_samples
+        self.max_pairs = max_pairs
+
+    def fit(self, X, y=None, sample_weight=None):
+        points = np.asarray(X, dtype=np.float64)
+        self.labels_, core = grid_dbscan(points, self.eps, self.min_samples, sample_weight, self.max_pairs)
+        self.core_sample_indices_ = np.flatnonzero(core)
+        self.components_ = points[self.core_sample_indices_].copy()
+        return self
+
+    def fit_predict(self, X, y=None, sample_weight=None):
+        return self.fit(X, sample_weight=sample_weight).labels_
+
+
+def grid_dbscan(points, eps, min_samples, sample_weight=None, max_pairs=2 ** 22):
+    """
+    DBSCAN labels of 2D points with the grid engine. Returns (labels, core) with core the boolean
+    mask of the core points.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    n_points = len(points)
+    if n_points == 0:
+        return np.empty(0, dtype=np.intp), np.zeros(0, dtype=bool)
+    weights = np.ones(n_points) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+
+    grid = build_grid(points, eps)
+    order, starts, counts = grid["order"], grid["starts"], grid["counts"]
+    points, weights = points[order], weights[order]  # Da qui in poi i punti sono ordinati per cella
+    n_cells = len(starts)
+    cell_of = np.repeat(np.arange(n_cells), counts)
+
+    # 1. Core point: tutta la propria cella (diametro < eps) più i vicini nelle celle intorno.
+    # Con pesi non negativi una cella che pesa almeno min_samples contiene solo core point
+    cell_weight = np.add.reduceat(weights, starts)
+    dense = cell_weight >= min_samples if np.all(weights >= 0) else np.zeros(n_cells, dtype=bool)
+    neighbour_weight = cell_weight[cell_of]
+    source, target = neighbour_cells(grid, _OFFSETS)
+    sparse = ~dense[source]
+    for a, b, _ in within_pairs(points, eps, starts[source[sparse]], counts[source[sparse]],
+                                starts[target[sparse]], counts[target[sparse]], max_pairs):
+        neighbour_weight += np.bincount(a, weights=weights[b], minlength=n_points)
+    core = dense[cell_of] | (neighbour_weight >= min_samples)
+
+    # 2. Componenti dei core point: le celle con core point si uniscono se due loro core distano <= eps
+    core_index = np.flatnonzero(core)
+    core_starts, core_counts = _subset_ranges(cell_of[core_index], n_cells)
+    has_core = core_counts > 0
+    source, target = neighbour_cells(grid, _FORWARD)
+    both = has_core[source] & has_core[target]
+    source, target = source[both], target[both]
+    linked = _linked_cell_pairs(points[core_index], eps, core_starts[source], core_counts[source],
+                                core_starts[target], core_counts[target], max_pairs)
+    graph = coo_matrix((np.ones(len(linked)), (source[linked], target[linked])), shape=(n_cells, n_cells))
+    _, component = connected_components(graph, directed=False)
+
+    # 3. Etichette numerate per indice originale minimo dei core point (l'ordine di visita di sklearn)
+    core_component = component[cell_of[core_index]]
+    first = np.full(component.max() + 1, n_points)
+    np.minimum.at(first, core_component, order[core_index])
+    used = np.flatnonzero(first < n_points)
+    component_label = np.full(len(first), -1)
+    component_label[used[np.argsort(first[used])]] = np.arange(len(used))
+    cell_label = np.where(has_core, component_label[component], -1)
+
+    labels = np.full(n_points, -1, dtype=np.intp)
+    labels[core_index] = component_label[core_component]
+
+    # 4. Bordi: l'etichetta più bassa tra i cluster dei core vicini (nella propria cella sono tutti vicini)
+    border_index = np.flatnonzero(~core)
+    best = np.where(has_core[cell_of[border_index]], cell_label[cell_of[border_index]], n_points)
+    border_starts, border_counts = _subset_ranges(cell_of[border_index], n_cells)
+    source, target = neighbour_cells(grid, _OFFSETS)
+    useful = (border_counts[source] > 0) & has_core[target]
+    source, target = source[useful], target[useful]
+    border_points, core_points = points[border_index], points[core_index]
+    core_labels = labels[core_index]
+    for a, b, _ in within_pairs((border_points, core_points), eps, border_starts[source], border_counts[source],
+                                core_starts[target], core_counts[target], max_pairs):
+        np.minimum.at(best, a, core_labels[b])
+    labels[border_index] = np.where(best < n_points, best, -1)
+
+    result_labels, result_core = np.empty_like(labels), np.empty_like(core)
+    result_labels[order], result_core[order] = labels, core
+    return result_labels, result_core
+
+
+def build_grid(points, eps):
+    """
+    Bucket the points into square cells of side eps / sqrt(2) (shrunk by a relative 1e-9, so that
+    rounding never puts two points farther than eps in the same cell).
+    Returns a dict with the point order sorted by cell, the cell keys and the start and count of
+    every occupied cell in that order.
+    """
+    cell_size = eps / np.sqrt(2) * (1 - 1e-9)
+    # Margine di 2 celle: le chiavi delle celle vicine non escono mai dalla griglia
+    cells = np.floor((points - points.min(axis=0)) / cell_size).astype(np.int64) + 2
+    span = int(cells[:, 1].max()) + 3
+    keys = cells[:, 0] * span + cells[:, 1]
+    order = np.argsort(keys, kind="stable")
+    cell_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    return {"order": order, "keys": cell_keys, "starts": starts, "counts": counts, "span": span}
+
+
+def neighbour_cells(grid, offsets):
+    """
+    All (source, target) pairs of occupied cells at the given (dx, dy) offsets.
+    """
+    sources, targets = [], []
+    cell_ids = np.arange(len(grid["keys"]))
+    for dx, dy in offsets:
+        wanted = grid["keys"] + dx * grid["span"] + dy
+        found = np.minimum(np.searchsorted(grid["keys"], wanted), len(grid["keys"]) - 1)
+        hit = grid["keys"][found] == wanted
+        sources.append(cell_ids[hit])
+        targets.append(found[hit])
+    return np.concatenate(sources), np.concatenate(targets)
+
+
+def within_pairs(points, eps, a_starts, a_counts, b_starts, b_counts, max_pairs):
+    """
+    Yield (a, b, pair) for all the point pairs within eps between the ranges a_starts[k] +
+    range(a_counts[k]) and b_starts[k] + range(b_counts[k]), `pair` being k. Candidate pairs are
+    expanded in chunks of about max_pairs (large cell pairs are split by rows).
+    `points` is one array, or an (a_points, b_points) tuple when the ranges index two arrays.
+    """
+    a_points, b_points = points if isinstance(points, tuple) else (points, points)
+    eps_squared = eps * eps
+
+    # Le coppie di celle troppo grandi si dividono in blocchi di righe
+    rows = np.maximum(1, max_pairs // np.maximum(b_counts, 1))
+    pieces = -(-a_counts // rows)
+    owner = np.repeat(np.arange(len(a_counts)), pieces)
+    piece = np.arange(len(owner)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    piece_starts = a_starts[owner] + piece * rows[owner]
+    piece_counts = np.minimum(rows[owner], a_starts[owner] + a_counts[owner] - piece_starts)
+    sizes = piece_counts * b_counts[owner]
+
+    cumulative = np.cumsum(sizes)
+    begin = 0
+    while begin < len(sizes):
+        # Blocchi consecutivi fino a circa max_pairs coppie candidate
+        limit = (cumulative[begin - 1] if begin else 0) + max_pairs
+        end = max(int(np.searchsorted(cumulative, limit, side="right")), begin + 1)
+        chunk, begin = slice(begin, end), end
+        chunk_sizes = sizes[chunk]
+        local = np.repeat(np.arange(len(chunk_sizes)), chunk_sizes)
+        step = np.arange(len(local)) - np.repeat(np.cumsum(chunk_sizes) - chunk_sizes, chunk_sizes)
+        width = b_counts[owner[chunk]][local]
+        a = piece_starts[chunk][local] + step // width
+        b = b_starts[owner[chunk]][local] + step % width
+
+        # Stesso test di sklearn (KD-tree): dx^2 + dy^2 <= eps^2
+        dx = a_points[a, 0] - b_points[b, 0]
+        dy = a_points[a, 1] - b_points[b, 1]
+        within = dx * dx + dy * dy <= eps_squared
+        yield a[within], b[within], owner[chunk][local][within]
+
+
+def _linked_cell_pairs(core_points, eps, a_starts, a_counts, b_starts, b_counts, max_pairs):
+    # Coppie di celle con almeno due core entro eps; le coppie enormi passano da un KD-tree
+    large = a_counts * b_counts > max_pairs
+    linked = np.zeros(len(a_counts), dtype=bool)
+    small = np.flatnonzero(~large)
+    for _, _, pair in within_pairs(core_points, eps, a_starts[small], a_counts[small],
+                                   b_starts[small], b_counts[small], max_pairs):
+        linked[small[pair]] = True
+
+    for pair in np.flatnonzero(large):
+        a_points = core_points[a_starts[pair]:a_starts[pair] + a_counts[pair]]
+        b_points = core_points[b_starts[pair]:b_starts[pair] + b_counts[pair]]
+        _, nearest = cKDTree(b_points).query(a_points, k=1, distance_upper_bound=eps * (1 + 1e-9))
+        found = nearest < len(b_points)
+        offsets = a_points[found] - b_points[nearest[found]]
+        # Verifica con lo stesso test esatto delle coppie piccole
+        linked[pair] = np.any(offsets[:, 0] * offsets[:, 0] + offsets[:, 1] * offsets[:, 1] <= eps * eps)
+    return np.flatnonzero(linked)
+
+
+def _subset_ranges(cells, n_cells):
+    # Inizio e lunghezza, per cella, di un sottoinsieme di punti già ordinato per cella
+    counts = np.bincount(cells, minlength=n_cells)
+    return np.cumsum(counts) - counts, counts
@@ -0,0 +1,404 @@
+import numpy as np
+import pandas as pd
+from Testing.Clustering.GridDBSCAN import grid_dbscan, build_grid, neighbour_cells, within_pairs
+
+# Celle di lato eps (3 x 3 celle coprono il vicinato); il margine relativo evita che un arrotondamento
+# porti due punti a distanza <= eps in celle non adiacenti
+_CELL_MARGIN = 1 + 1e-9
+_WINDOW = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+_ALL_OFFSETS = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3)]
+
+
+class IncrementalDBSCAN:
+    """
+    DBSCAN that keeps its state between runs and absorbs point insertions, deletions and moves
+    locally, always giving the labels a full DBSCAN (GridDBSCAN / sklearn) would give on the
+    current points.
+
+    Kept state: a hash grid of cells with side eps, the neighbour weight of every point (itself
+    included, the DBSCAN core test), the connected components of the core points and, for the
+    non-core points, the core points within eps. An update only touches the eps-neighbourhood
+    of the changed points: a point that becomes core merges the components of its core
+    neighbours, a core point that disappears splits its component only if its remaining core
+    neighbours are no longer connected, which is checked with interleaved searches from each of
+    them (the cost is the size of the smaller piece, or a few steps when nothing splits).
+
+    Points are identified by integer ids, assigned by fit/insert and stable until deleted; a move
+    keeps the id. Cluster numbers depend on the order of the points (clusters are numbered by
+    their first core point), so labels are produced for an explicit order with labels_for.
+    """
+
+    def __init__(self, eps=0.5, min_samples=5, refit_fraction=0.25, max_pairs=2 ** 22):
+        self.eps = eps
+        self.min_samples = min_samples
+        # sync riparte da zero (fit vettoriale) se cambia più di questa frazione dei punti
+        self.refit_fraction = refit_fraction
+        self.max_pairs = max_pairs
+        self.labels_ = None  # Labels of the rows of the last fit/sync
+        self.last_changes = None  # Inserted/deleted/moved counts of the last sync
+        self._reset(0)
+
+    def _reset(self, capacity):
+        self._cell_size = self.eps * _CELL_MARGIN
+        self._xy = np.empty((capacity, 2))
+        self._weight = np.empty(capacity)
+        self._weight_sum = np.empty(capacity)
+        self._component = np.full(capacity, -1, dtype=np.int64)  # Componente dei core point, -1 per gli altri
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._size = 0
+        self._cells = {}
+        self._members = {}  # Componente -> insieme dei suoi core point
+        self._next_component = 0
+        self._border = {}  # Punto non core -> core point entro eps
+        self._dirty = set()  # Punti non core con la lista dei core vicini da ricalcolare
+        self._keys = None  # Chiavi delle righe dell'ultima sync e id corrispondenti
+        self._key_ids = np.empty(0, dtype=np.intp)
+
+    @property
+    def ids_(self):
+        """
+        Ids of the live points, in increasing order.
+        """
+        return np.flatnonzero(self._alive[:self._size])
+
+    def fit(self, X, y=None, sample_weight=None):
+        """
+        Build the state from scratch for the points X (ids 0..n-1) in one vectorized pass.
+        """
+        points = np.asarray(X, dtype=np.float64).reshape(-1, 2)
+        n_points = len(points)
+        weights = np.ones(n_points) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+        self._reset(n_points)
+        self._xy[:], self._weight[:], self._alive[:] = points, weights, True
+        self._size = n_points
+        if n_points == 0:
+            self.labels_ = np.empty(0, dtype=np.intp)
+            return self
+
+        labels, core = grid_dbscan(points, self.eps, self.min_samples, weights, self.max_pairs)
+        self._component[core] = labels[core]
+        self._next_component = int(labels.max()) + 1
+        order = np.argsort(labels[core], kind="stable")
+        core_index = np.flatnonzero(core)[order]
+        split = np.flatnonzero(np.diff(labels[core][order])) + 1
+        # np.split di un array vuoto dà un gruppo vuoto: senza core point non ci sono componenti
+        self._members = {int(labels[group[0]]): set(group.tolist()) for group in np.split(core_index, split)} \
+            if core_index.size else {}
+
+        # Pesi dei vicini e coppie (non core, core) entro eps, a blocchi di max_pairs coppie
+        self._weight_sum[:] = 0.0
+        border_pairs = []
+        for a, b in _all_pairs(points, self.eps, self.max_pairs):
+            self._weight_sum += np.bincount(a, weights=weights[b], minlength=n_points)
+            keep = ~core[a] & core[b]
+            border_pairs.append((a[keep], b[keep]))
+        a = np.concatenate([pair[0] for pair in border_pairs])
+        b = np.concatenate([pair[1] for pair in border_pairs])
+        order = np.argsort(a, kind="stable")
+        a, b = a[order], b[order]
+        starts = np.flatnonzero(np.r_[True, a[1:] != a[:-1]]) if len(a) else np.empty(0, dtype=np.intp)
+        self._border = dict(zip(a[starts].tolist(), np.split(b, starts[1:])))
+
+        cells = np.floor(points / self._cell_size).astype(np.int64)
+        order = np.lexsort((cells[:, 1], cells[:, 0]))
+        starts = np.flatnonzero(np.r_[True, np.any(cells[order][1:] != cells[order][:-1], axis=1)])
+        keys = map(tuple, cells[order][starts].tolist())
+        self._cells = dict(zip(keys, (group.tolist() for group in np.split(order, starts[1:]))))
+
+        self.labels_ = self.labels_for(np.arange(n_points))
+        return self
+
+    def fit_predict(self, X, y=None, sample_weight=None):
+        return self.fit(X, sample_weight=sample_weight).labels_
+
+    def insert(self, X, sample_weight=None):
+        """
+        Add the points X and return their ids.
+        """
+        points = np.asarray(X, dtype=np.float64).reshape(-1, 2)
+        weights = np.ones(len(points)) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+        self._reserve(self._size + len(points))
+        ids = np.arange(self._size, self._size + len(points))
+        self._size += len(points)
+        for point_id, (x, y), weight in zip(ids.tolist(), points.tolist(), weights.tolist()):
+            self._add(point_id, x, y, weight)
+        return ids
+
+    def delete(self, ids):
+        """
+        Remove the points with the given ids.
+        """
+        for point_id in np.atleast_1d(ids).tolist():
+            self._remove(point_id)
+
+    def move(self, ids, X, sample_weight=None):
+        """
+        Move the points with the given ids to X (and give them new weights, if passed).
+        """
+        ids = np.atleast_1d(ids).tolist()
+        points = np.asarray(X, dtype=np.float64).reshape(-1, 2).tolist()
+        weights = [self._weight[point_id] for point_id in ids] if sample_weight is None else \
+            np.asarray(sample_weight, dtype=np.float64).tolist()
+        for point_id, (x, y), weight in zip(ids, points, weights):
+            self._remove(point_id)
+            self._add(point_id, x, y, weight)
+
+    def sync(self, X, keys=None, sample_weight=None):
+        """
+        Bring the state to the snapshot X and set labels_ to the labels of its rows, in order.
+
+        Rows are matched to the stored points by `keys` (one hashable per row, e.g. an order id):
+        unknown keys are inserted, missing ones deleted and known keys with new coordinates or
+        weight moved. Without keys a row is identified by its coordinates, so a moved point
+        counts as one deletion and one insertion. When more than refit_fraction of the points
+        change (or on the first call), the state is rebuilt with fit, which gives the same labels.
+        """
+        points = np.asarray(X, dtype=np.float64).reshape(-1, 2)
+        weights = np.ones(len(points)) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+        if keys is None:
+            # Chiave = coordinate + numero di occorrenza, per distinguere i punti coincidenti
+            frame = pd.DataFrame(points, columns=['x', 'y'])
+            keys = pd.MultiIndex.from_arrays([points[:, 0], points[:, 1], frame.groupby(['x', 'y']).cumcount()])
+        else:
+            keys = pd.Index(keys)
+        if not keys.is_unique:
+            raise ValueError("sync keys must be unique.")
+
+        # Confronto vettoriale con le chiavi della sincronizzazione precedente
+        position = self._keys.get_indexer(keys) if self._keys is not None else np.full(len(keys), -1)
+        known_rows = np.flatnonzero(position >= 0)
+        known_ids = self._key_ids[position[known_rows]] if len(known_rows) else np.empty(0, dtype=np.intp)
+        present = np.zeros(len(self._key_ids), dtype=bool)
+        present[position[known_rows]] = True
+        deleted = self._key_ids[~present]
+        changed = np.any(self._xy[known_ids] != points[known_rows], axis=1) | \
+            (self._weight[known_ids] != weights[known_rows])
+        inserted = np.flatnonzero(position < 0)
+
+        n_changes = len(deleted) + int(changed.sum()) + len(inserted)
+        refit = self._keys is None or n_changes > self.refit_fraction * max(len(self._key_ids), len(keys))
+        if refit:
+            self.fit(points, sample_weight=weights)
+            ids = np.arange(len(keys))
+        else:
+            self.delete(deleted)
+            self.move(known_ids[changed], points[known_rows[changed]], weights[known_rows[changed]])
+            ids = np.empty(len(keys), dtype=np.intp)
+            ids[known_rows] = known_ids
+            ids[inserted] = self.insert(points[inserted], weights[inserted])
+            self.labels_ = self.labels_for(ids)
+        self._keys, self._key_ids = keys, ids
+
+        self.last_changes = {"inserted": len(inserted), "deleted": len(deleted), "moved": int(changed.sum()),
+                             "refit": refit}
+        return self
+
+    def labels_for(self, ids):
+        """
+        Labels of the points `ids` (all the live points, in any order), numbered as a full DBSCAN
+        on the points in that order would number them: -1 is noise, clusters are numbered by
+        their first core point and a border point takes the lowest label of its core neighbours.
+        """
+        ids = np.asarray(ids, dtype=np.intp)
+        if len(ids) != np.count_nonzero(self._alive[:self._size]):
+            raise ValueError("labels_for needs every live point exactly once.")
+        self._refresh_borders()
+
+        labels = np.full(len(ids), -1, dtype=np.intp)
+        component = self._component[ids]
+        core = component >= 0
+        # Cluster numerati per prima occorrenza nell'ordine richiesto
+        components, first = np.unique(component[core], return_index=True)
+        component_label = np.empty(len(components), dtype=np.intp)
+        component_label[np.argsort(first)] = np.arange(len(components))
+        labels[core] = component_label[np.searchsorted(components, component[core])]
+
+        has_border = np.zeros(self._size, dtype=bool)
+        has_border[np.fromiter(self._border, dtype=np.intp, count=len(self._border))] = True
+        border_rows = np.flatnonzero(has_border[ids])
+        if len(border_rows):
+            neighbours = [self._border[point_id] for point_id in ids[border_rows].tolist()]
+            lengths = np.fromiter((len(group) for group in neighbours), dtype=np.intp, count=len(neighbours))
+            neighbour_labels = component_label[np.searchsorted(components, self._component[np.concatenate(neighbours)])]
+            labels[border_rows] = np.minimum.reduceat(neighbour_labels, np.cumsum(lengths) - lengths)
+        return labels
+
+    def _reserve(self, capacity):
+        if capacity <= len(self._alive):
+            return
+        capacity = max(capacity, 2 * len(self._alive))
+        extra = capacity - len(self._alive)
+        self._xy = np.concatenate([self._xy, np.empty((extra, 2))])
+        self._weight = np.concatenate([self._weight, np.empty(extra)])
+        self._weight_sum = np.concatenate([self._weight_sum, np.empty(extra)])
+        self._component = np.concatenate([self._component, np.full(extra, -1, dtype=np.int64)])
+        self._alive = np.concatenate([self._alive, np.zeros(extra, dtype=bool)])
+
+    def _cell(self, x, y):
+        return int(np.floor(x / self._cell_size)), int(np.floor(y / self._cell_size))
+
+    def _neighbours(self, x, y):
+        # Punti vivi entro eps da (x, y), con lo stesso test di GridDBSCAN: dx^2 + dy^2 <= eps^2
+        cx, cy = self._cell(x, y)
+        candidates = [point_id for dx, dy in _WINDOW for point_id in self._cells.get((cx + dx, cy + dy), ())]
+        candidates = np.array(candidates, dtype=np.intp)
+        dx = self._xy[candidates, 0] - x
+        dy = self._xy[candidates, 1] - y
+        return candidates[dx * dx + dy * dy <= self.eps * self.eps]
+
+    def _add(self, point_id, x, y, weight):
+        self._xy[point_id] = x, y
+        self._weight[point_id] = weight
+        self._weight_sum[point_id] = 0.0
+        self._alive[point_id] = True
+        self._cells.setdefault(self._cell(x, y), []).append(point_id)
+
+        neighbours = self._neighbours(x, y)
+        others = neighbours[neighbours != point_id]
+        before = self._weight_sum[neighbours].copy()
+        self._weight_sum[others] += weight
+        self._weight_sum[point_id] = weight + self._weight[others].sum()
+        self._dirty.add(point_id)
+        self._update_core(neighbours, before)
+
+    def _remove(self, point_id):
+        x, y = self._xy[point_id]
+        cell = self._cell(x, y)
+        self._cells[cell].remove(point_id)
+        if not self._cells[cell]:
+            del self._cells[cell]
+
+        neighbours = self._neighbours(x, y)
+        before = self._weight_sum[neighbours].copy()
+        self._weight_sum[neighbours] -= self._weight[point_id]
+        self._alive[point_id] = False
+        self._border.pop(point_id, None)
+        self._dirty.discard(point_id)
+        # Un core point cancellato si tratta come un core point declassato
+        self._update_core(neighbours, before, deleted=[point_id] if self._component[point_id] >= 0 else [])
+
+    def _update_core(self, neighbours, before, deleted=()):
+        # Prima i core point persi (possibili divisioni), poi quelli nuovi (solo unioni)
+        after = self._weight_sum[neighbours]
+        was_core, is_core = before >= self.min_samples, after >= self.min_samples
+        lost = neighbours[was_core & ~is_core & (self._component[neighbours] >= 0)]
+        self._demote(list(deleted) + lost.tolist())
+        for point_id in neighbours[is_core & (self._component[neighbours] < 0)].tolist():
+            self._promote(point_id)
+
+    def _promote(self, point_id):
+        neighbours = self._neighbours(*self._xy[point_id])
+        self._dirty.update(neighbours.tolist())
+        self._border.pop(point_id, None)
+        components = set(self._component[neighbours].tolist()) - {-1}
+        if not components:
+            target = self._next_component
+            self._next_component += 1
+            self._members[target] = set()
+        else:
+            # Le componenti più piccole confluiscono nella più grande
+            target = max(components, key=lambda component: len(self._members[component]))
+            for component in components - {target}:
+                members = self._members.pop(component)
+                self._component[list(members)] = target
+                self._members[target] |= members
+        self._component[point_id] = target
+        self._members[target].add(point_id)
+
+    def _demote(self, point_ids):
+        point_ids = list(point_ids)
+        if not point_ids:
+            return
+        affected = set()
+        for point_id in point_ids:
+            component = int(self._component[point_id])
+            self._component[point_id] = -1
+            self._members[component].discard(point_id)
+            affected.add(component)
+        # I core vicini rimasti sono i semi: ogni pezzo della componente ne contiene almeno uno
+        seeds = {component: set() for component in affected}
+        for point_id in point_ids:
+            neighbours = self._neighbours(*self._xy[point_id])
+            self._dirty.update(neighbours[self._alive[neighbours]].tolist())
+            if self._alive[point_id]:
+                self._dirty.add(point_id)
+            for neighbour in neighbours[self._component[neighbours] >= 0].tolist():
+                seeds.setdefault(int(self._component[neighbour]), set()).add(neighbour)
+        for component in affected:
+            if not self._members[component]:
+                del self._members[component]
+            elif len(seeds[component]) > 1:
+                self._split(component, list(seeds[component]))
+
+    def _split(self, component, seeds):
+        """
+        Split `component` into its connected pieces. One search per seed advances one point per
+        round; searches that meet are merged, and a search that runs out of points has found a
+        whole piece, which gets a new component. The last search left keeps the component.
+        """
+        parent = list(range(len(seeds)))
+        frontier = [[seed] for seed in seeds]
+        visited = [[seed] for seed in seeds]
+        owner = {seed: index for index, seed in enumerate(seeds)}
+        roots = set(range(len(seeds)))
+
+        def find(index):
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        while len(roots) > 1:
+            for index in list(roots):
+                if index not in roots or len(roots) == 1:
+                    continue
+                if not frontier[index]:
+                    piece = visited[index]
+                    self._component[piece] = self._next_component
+                    self._members[self._next_component] = set(piece)
+                    self._members[component].difference_update(piece)
+                    self._next_component += 1
+                    roots.discard(index)
+                    continue
+                point_id = frontier[index].pop()
+                neighbours = self._neighbours(*self._xy[point_id])
+                for neighbour in neighbours[self._component[neighbours] == component].tolist():
+                    other = owner.get(neighbour)
+                    if other is None:
+                        owner[neighbour] = index
+                        frontier[index].append(neighbour)
+                        visited[index].append(neighbour)
+                        continue
+                    other = find(other)
+                    if other != index:
+                        # Le due ricerche si sono incontrate: la più piccola confluisce nella più grande
+                        if len(visited[other]) > len(visited[index]):
+                            index, other = other, index
+                        parent[other] = index
+                        frontier[index].extend(frontier[other])
+                        visited[index].extend(visited[other])
+                        frontier[other], visited[other] = [], []
+                        roots.discard(other)
+
+    def _refresh_borders(self):
+        # Ricalcola i core vicini dei punti non core toccati dagli ultimi aggiornamenti
+        for point_id in self._dirty:
+            self._border.pop(point_id, None)
+            if not self._alive[point_id] or self._component[point_id] >= 0:
+                continue
+            neighbours = self._neighbours(*self._xy[point_id])
+            cores = neighbours[self._component[neighbours] >= 0]
+            if len(cores):
+                self._border[point_id] = cores
+        self._dirty.clear()
+
+
+def _all_pairs(points, eps, max_pairs):
+    # Tutte le coppie (a, b) di punti entro eps, ciascun punto con sé stesso compreso, in indici originali
+    grid = build_grid(points, eps)
+    order = grid["order"]
+    sorted_points = points[order]
+    source, target = neighbour_cells(grid, _ALL_OFFSETS)
+    for a, b, _ in within_pairs(sorted_points, eps, grid["starts"][source], grid["counts"][source],
+                                grid["starts"][target], grid["counts"][target], max_pairs):
+        yield order[a], order[b]
@@ -0,0 +1,75 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def nearest_neighbours(points, k):
+    """
+    The k nearest neighbours of every point (the point itself included) from one KD-tree and a
+    single batched query. Returns (neighbours, squared) with the exact squared distances
+    dx^2 + dy^2 (the DBSCAN neighbourhood test), both sorted by distance along each row.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    _, neighbours = cKDTree(points).query(points, k=k, workers=-1)
+    neighbours = neighbours.reshape(len(points), k)
+    offsets = points[neighbours] - points[:, None, :]
+    squared = offsets[..., 0] * offsets[..., 0] + offsets[..., 1] * offsets[..., 1]
+    order = np.argsort(squared, axis=1, kind="stable")
+    return np.take_along_axis(neighbours, order, axis=1), np.take_along_axis(squared, order, axis=1)
+
+
+def core_distances(points, min_samples, sample_weight=None, squared=False):
+    """
+    Distance of every point to its min_samples-th nearest neighbour, the point itself included
+    (the DBSCAN convention): a point is a core point exactly when this distance is <= eps.
+
+    With `sample_weight` (coreset weights, >= 1) the distance is the one at which the cumulative
+    weight of the nearest neighbours first reaches min_samples. With squared=True the squared
+    distances are returned, to be compared with eps^2 as DBSCAN does.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    k = min(int(np.ceil(min_samples)), len(points))
+    neighbours, distances = nearest_neighbours(points, k)
+    result = core_from_neighbours(neighbours, distances, min_samples, sample_weight)
+    return result if squared else np.sqrt(result)
+
+
+def core_from_neighbours(neighbours, distances, min_samples, sample_weight=None):
+    """
+    Core distances (in the units of `distances`) from a sorted nearest-neighbour table such as
+    the one of nearest_neighbours; inf for the points that never reach min_samples.
+    """
+    rows = np.arange(len(neighbours))
+    if sample_weight is None:
+        if neighbours.shape[1] < min_samples:
+            return np.full(len(neighbours), np.inf)  # Meno punti di min_samples: nessun core point
+        return distances[:, int(np.ceil(min_samples)) - 1]
+    # Primo vicino a cui il peso cumulato raggiunge min_samples (inf se non lo raggiunge mai)
+    cumulative = np.cumsum(np.asarray(sample_weight, dtype=np.float64)[neighbours], axis=1)
+    reached = cumulative >= min_samples
+    first = np.argmax(reached, axis=1)
+    return np.where(reached[rows, first], distances[rows, first], np.inf)
+
+
+def knee_index(curve):
+    """
+    Index of the knee of an ascending curve: the point farthest below the chord joining its
+    ends, once both axes are scaled to [0, 1] (the Kneedle criterion for a convex curve).
+    """
+    curve = np.asarray(curve, dtype=np.float64)
+    if len(curve) < 3 or curve[-1] == curve[0]:
+        return len(curve) - 1
+    x = np.linspace(0.0, 1.0, len(curve))
+    y = (curve - curve[0]) / (curve[-1] - curve[0])
+    return int(np.argmax(x - y))
+
+
+def estimate_eps(points, min_samples, sample_weight=None):
+    """
+    DBSCAN eps at the knee of the sorted k-distance curve (k = min_samples).
+    Returns (eps, curve) with curve the ascending k-distances of the points with a finite one.
+    """
+    curve = np.sort(core_distances(points, min_samples, sample_weight))
+    curve = curve[np.isfinite(curve)]
+    if len(curve) == 0:
+        raise ValueError(f"No point has {min_samples} neighbours: eps cannot be estimated.")
+    return float(curve[knee_index(curve)]), curve
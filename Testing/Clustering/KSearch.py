@@ -0,0 +1,136 @@
+import numpy as np
+
+# Rapporto aureo inverso, usato per posizionare i punti interni della ricerca
+INV_PHI = (np.sqrt(5) - 1) / 2
+
+
+def search_silhouette_max(evaluate, k_min, k_max, tolerance=0.25):
+    """
+    Find the k with the highest silhouette score in [k_min, k_max] with O(log K) fits.
+
+    `evaluate(k_values)` returns a {k: score} dict for the requested k values. A geometric
+    coarse grid brackets the maximum, then an integer golden-section search refines it. Before
+    accepting, the neighbours of the optimum and the k values just outside the bracket are
+    scored, and the optimum must beat every evaluated k.
+    Returns (best_k, scores) or (None, scores) when the coarse curve is not unimodal (beyond
+    `tolerance` times its range) or the check fails, and the caller has to fall back to the
+    exhaustive sweep. The search is approximate: a maximum between grid points far from the
+    bracket can still be missed.
+    """
+    scores = {}
+
+    def score(k_values):
+        missing = [k for k in k_values if k not in scores]
+        if missing:
+            scores.update(evaluate(missing))
+        return [scores[k] for k in k_values]
+
+    grid = coarse_grid(k_min, k_max)
+    values = score(grid)
+    if not is_unimodal(values, tolerance):
+        return None, scores
+
+    best = int(np.argmax(values))
+    low = grid[max(best - 1, 0)]
+    high = grid[min(best + 1, len(grid) - 1)]
+    outside = [low - 1, high + 1]
+
+    # Ricerca della sezione aurea su interi: l'intervallo si restringe di 1/φ a ogni passo
+    while high - low > 2:
+        step = int(round((high - low) * INV_PHI))
+        inner_low, inner_high = high - step, low + step
+        if inner_low >= inner_high:
+            inner_low, inner_high = low + 1, high - 1
+        left, right = score([inner_low, inner_high])
+        if left < right:
+            low = inner_low
+        else:
+            high = inner_high
+
+    candidates = list(range(low, high + 1))
+    values = score(candidates)
+    best_k = candidates[int(np.argmax(values))]
+
+    # Verifica: i vicini dell'ottimo e i k appena fuori dalla parentesi non devono superarlo
+    score([k for k in [best_k - 1, best_k + 1] + outside if k_min <= k <= k_max])
+    if max(scores, key=scores.get) != best_k:
+        return None, scores
+    return best_k, scores
+
+
+def search_elbow(evaluate, k_min, k_max, ratio=0.1):
+    """
+    Find the elbow used by KMeansAnalysis.elbow_method (the first k whose inertia drop to k+1
+    is below `ratio` times the first drop) with O(log K) fits: the condition is checked on a
+    geometric coarse grid up to its first hit, then bisected inside that bracket. The grid can
+    step over an earlier k that already meets the condition, so the whole grid interval just
+    below the bracket is checked too, falling back when any of its k does.
+
+    `evaluate(k_values)` returns a {k: inertia} dict. The search assumes the inertia drops
+    shrink with k (convex curve); if the evaluated points contradict that by more than the
+    elbow threshold itself, it returns (None, inertia) so the caller can fall back to the
+    exhaustive sweep. Earlier grid intervals are not scanned, so the search is approximate
+    when the curve is not convex there.
+    """
+    inertia = {}
+
+    def drop(k):
+        missing = [j for j in (k, k + 1) if j not in inertia]
+        if missing:
+            inertia.update(evaluate(missing))
+        return abs(inertia[k] - inertia[k + 1])
+
+    threshold = ratio * drop(k_min)
+
+    low, high, below = k_min, None, k_min
+    for k in coarse_grid(k_min, k_max - 1)[1:]:
+        if drop(k) < threshold:
+            high = k
+            break
+        below, low = low, k
+    if high is None:
+        # Nessun k soddisfa la condizione: come argmax su un vettore tutto False
+        return (k_min if _is_convex(inertia, threshold) else None), inertia
+
+    # Invariante: la condizione è falsa in `low` e vera in `high`
+    while high - low > 1:
+        middle = (low + high) // 2
+        if drop(middle) < threshold:
+            high = middle
+        else:
+            low = middle
+
+    # k saltati dalla griglia appena sotto la parentesi: un primo gomito lì renderebbe `high` sbagliato
+    if any(drop(k) < threshold for k in range(below + 1, low)):
+        return None, inertia
+    return (high if _is_convex(inertia, threshold) else None), inertia
+
+
+def coarse_grid(k_min, k_max):
+    """
+    Roughly log2(K) + 1 geometrically spaced k values from k_min to k_max.
+    """
+    n_points = int(np.ceil(np.log2(max(k_max - k_min + 1, 2)))) + 1
+    return sorted({int(round(k)) for k in np.geomspace(k_min, k_max, n_points)})
+
+
+def is_unimodal(values, tolerance=0.0):
+    """
+    True if the sequence rises up to its maximum and then falls, ignoring wiggles smaller
+    than `tolerance` times the range of the values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    slack = tolerance * (values.max() - values.min())
+    peak = int(np.argmax(values))
+    return bool(np.all(np.diff(values[:peak + 1]) >= -slack) and np.all(np.diff(values[peak:]) <= slack))
+
+
+def _is_convex(inertia, slack):
+    # Sui punti valutati l'inerzia deve decrescere e i salti tra k consecutivi non devono
+    # crescere di più di `slack` (le singole inizializzazioni di k-means sono rumorose)
+    ks = sorted(inertia)
+    values = np.array([inertia[k] for k in ks])
+    if np.any(np.diff(values) > slack):
+        return False
+    drops = [inertia[k] - inertia[k + 1] for k in ks if k + 1 in inertia]
+    return all(later - earlier <= slack for earlier, later in zip(drops, drops[1:]))
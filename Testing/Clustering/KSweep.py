@@ -0,0 +1,260 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from threadpoolctl import threadpool_limits
+from Testing.Clustering.SharedArray import share_array, attach_array
+from Testing.Clustering.Silhouette import estimate_silhouette
+
+# Sotto questa dimensione avviare i processi costa più dei fit: lo sweep resta sequenziale
+POOL_MIN_POINTS = 20000
+
+# Stato del processo worker: coordinate (ed eventuali pesi, come terza colonna dello stesso blocco)
+# vengono agganciati una sola volta nell'initializer e non vengono serializzati a ogni task.
+_worker_shm = None
+_worker_data = None
+_worker_weight = None
+
+
+def _init_worker(name, shape, dtype, blas_threads):
+    """
+    Attach the worker to the shared coordinate array (x, y and, for weighted points, the weight
+    column) and cap its BLAS/OpenMP thread pools.
+    """
+    global _worker_shm, _worker_data, _worker_weight
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(blas_threads)
+    threadpool_limits(blas_threads)
+    _worker_shm, block = attach_array(name, shape, dtype)
+    _worker_data = block[:, :2]
+    _worker_weight = block[:, 2] if block.shape[1] > 2 else None
+
+
+def make_kmeans(n_clusters, random_state=42, mode="full", batch_size=1024, init=None):
+    """
+    KMeans ('full') or MiniBatchKMeans ('minibatch') model for k clusters; `init` starts it from
+    the given centroids (one run) instead of k-means++.
+    """
+    options = {} if init is None else {"init": init, "n_init": 1}
+    if mode == "minibatch":
+        return MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, random_state=random_state, **options)
+    if mode != "full":
+        raise ValueError(f"Unknown mode '{mode}'. Use 'full' or 'minibatch'.")
+    return KMeans(n_clusters=n_clusters, random_state=random_state, **options)
+
+
+def _model_params(mode, batch_size):
+    # I fit minibatch hanno chiavi proprie; quelle dei fit completi restano invariate (le riusa run_kmeans)
+    return {} if mode == "full" else {"mode": mode, "batch_size": batch_size}
+
+
+def fit_k(data, n_clusters, random_state=42, compute_silhouette=False, silhouette_mode="sklearn",
+          silhouette_sample_size=10000, cached=None, sample_weight=None, mode="full", batch_size=1024):
+    """
+    Fit a single KMeans (MiniBatchKMeans with mode='minibatch') for the given k and return labels,
+    centroids, inertia and (optionally) silhouette score. If `cached` holds a previous fit for the
+    same k, only the missing score is computed.
+    """
+    if cached is None:
+        kmeans = make_kmeans(n_clusters, random_state, mode, batch_size)
+        labels = kmeans.fit_predict(data, sample_weight=sample_weight)
+        result = fit_result(kmeans, labels)
+    else:
+        result = dict(cached, scores=dict(cached["scores"]))
+    return _add_silhouette(data, result, compute_silhouette, silhouette_mode, silhouette_sample_size, sample_weight)
+
+
+def _fit_k_shared(n_clusters, *args, **kwargs):
+    return fit_k(_worker_data, n_clusters, *args, sample_weight=_worker_weight, **kwargs)
+
+
+def sweep_kmeans(data, k_values, random_state=42, compute_silhouette=False, n_jobs=None,
+                 silhouette_mode="sklearn", silhouette_sample_size=10000, cache=None, sample_weight=None,
+                 pool_min_points=POOL_MIN_POINTS, mode="full", batch_size=1024):
+    """
+    Fit one KMeans per k in `k_values` and return the inertia/silhouette curves in one call.
+    With mode='minibatch' every fit is a MiniBatchKMeans with the given batch_size.
+
+    With n_jobs > 1 and at least pool_min_points points the fits are spread over a process pool
+    whose workers read the coordinates (and weights) from shared memory and run with a single
+    BLAS thread each; every fit uses the same seed, so the curves are identical to the
+    sequential sweep. Smaller datasets are swept sequentially, since starting the pool costs
+    more than the fits. Fits (and scores) already in `cache`
+    are not recomputed. `sample_weight` weights the points (e.g. coreset representatives).
+    """
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    k_values = list(k_values)
+    options = (random_state, compute_silhouette, silhouette_mode, silhouette_sample_size)
+    score = _score_key(silhouette_mode, silhouette_sample_size)
+    model = {"mode": mode, "batch_size": batch_size}
+
+    keys, results = {}, {}
+    if cache is not None:
+        fingerprint = weighted_fingerprint(cache, data, sample_weight)
+        for k in k_values:
+            keys[k] = cache.make_key(fingerprint, "kmeans", n_clusters=k, random_state=random_state,
+                                     **_model_params(mode, batch_size))
+            results[k] = cache.get(keys[k])
+    pending = [k for k in k_values
+               if results.get(k) is None or (compute_silhouette and score not in results[k]["scores"])]
+    n_jobs = resolve_n_jobs(n_jobs, len(pending)) if len(data) >= pool_min_points else 1
+
+    if n_jobs == 1:
+        fitted = {k: fit_k(data, k, *options, results.get(k), sample_weight, **model) for k in pending}
+    else:
+        block = data if sample_weight is None else np.column_stack([data, sample_weight])
+        with share_array(block) as handle:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                     initargs=(*handle, 1)) as executor:
+                # Le k più grandi sono le più costose: vengono sottomesse per prime
+                futures = {k: executor.submit(_fit_k_shared, k, *options, results.get(k), **model)
+                           for k in sorted(pending, reverse=True)}
+                fitted = {k: futures[k].result() for k in pending}
+
+    for k, result in fitted.items():
+        results[k] = result
+        if cache is not None:
+            cache.put(keys[k], result)
+
+    return _curves(k_values, [results[k] for k in k_values], compute_silhouette, score)
+
+
+def sweep_kmeans_warm(data, k_values, random_state=42, compute_silhouette=False, silhouette_mode="sklearn",
+                      silhouette_sample_size=10000, cache=None, sample_weight=None, mode="full", batch_size=1024):
+    """
+    Incremental k sweep: the smallest k is fitted with k-means++, then every following k is
+    seeded from the previous centroids plus one extra centre obtained by splitting the cluster
+    with the largest SSE, so each step only needs a few Lloyd iterations (mini-batch steps with
+    mode='minibatch').
+    """
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    k_values = sorted(k_values)
+    score = _score_key(silhouette_mode, silhouette_sample_size)
+    fingerprint = weighted_fingerprint(cache, data, sample_weight) if cache is not None else None
+    results = []
+
+    for n_clusters in k_values:
+        # La soluzione per k dipende dal k di partenza della catena, che entra quindi nella chiave
+        key = None
+        result = None
+        if cache is not None:
+            key = cache.make_key(fingerprint, "kmeans_warm", n_clusters=n_clusters, k_start=k_values[0],
+                                 random_state=random_state, **_model_params(mode, batch_size))
+            result = cache.get(key)
+
+        if result is not None and not (compute_silhouette and score not in result["scores"]):
+            results.append(result)
+            continue
+
+        if result is None:
+            if not results:
+                kmeans = make_kmeans(n_clusters, random_state, mode, batch_size)
+            else:
+                centers, labels = results[-1]["centroids"], results[-1]["labels"]
+                while len(centers) < n_clusters:
+                    centers, labels = split_worst_cluster(data, centers, labels, sample_weight)
+                kmeans = make_kmeans(n_clusters, random_state, mode, batch_size, init=centers)
+            labels = kmeans.fit_predict(data, sample_weight=sample_weight)
+            result = fit_result(kmeans, labels)
+        else:
+            result = dict(result, scores=dict(result["scores"]))
+
+        result = _add_silhouette(data, result, compute_silhouette, silhouette_mode, silhouette_sample_size,
+                                 sample_weight)
+        if cache is not None:
+            cache.put(key, result)
+        results.append(result)
+
+    return _curves(k_values, results, compute_silhouette, score)
+
+
+def fit_result(kmeans, labels):
+    """
+    Cacheable summary of a fitted KMeans (or MiniBatchKMeans): labels, centroids, inertia, iterations and scores.
+    """
+    return {
+        "labels": labels.astype(np.int32),
+        "centroids": kmeans.cluster_centers_,
+        "inertia": kmeans.inertia_,
+        "n_iter": kmeans.n_iter_,
+        "scores": {},
+    }
+
+
+def _score_key(silhouette_mode, silhouette_sample_size):
+    # Il valore campionato dipende dalla dimensione del campione, quello esatto no
+    return f"silhouette_{silhouette_mode}" + (f"_{silhouette_sample_size}" if silhouette_mode == "sampled" else "")
+
+
+def weighted_fingerprint(cache, data, sample_weight=None):
+    """
+    Cache fingerprint of the coordinates, and of the weights when the points are weighted.
+    """
+    if sample_weight is None:
+        return cache.fingerprint(data)
+    return cache.fingerprint(np.column_stack([data, sample_weight]))
+
+
+def _add_silhouette(data, result, compute_silhouette, silhouette_mode, silhouette_sample_size, sample_weight=None):
+    score = _score_key(silhouette_mode, silhouette_sample_size)
+    if compute_silhouette and score not in result["scores"]:
+        result["scores"][score] = estimate_silhouette(data, result["labels"], mode=silhouette_mode,
+                                                      sample_size=silhouette_sample_size, weights=sample_weight)[0]
+    return result
+
+
+def _curves(k_values, results, compute_silhouette, score):
+    return {
+        "k": k_values,
+        "inertia": [r["inertia"] for r in results],
+        "silhouette": [r["scores"][score] for r in results] if compute_silhouette else None,
+        "n_iter": [r["n_iter"] for r in results],
+    }
+
+
+def split_worst_cluster(data, centers, labels, sample_weight=None):
+    """
+    Split the cluster with the largest SSE in two along its principal axis and return the
+    new centres (one more than before) together with the updated labels.
+    """
+    sq_dist = np.sum((data - centers[labels]) ** 2, axis=1)
+    sse = np.bincount(labels, weights=sq_dist if sample_weight is None else sq_dist * sample_weight,
+                      minlength=len(centers))
+    worst = int(np.argmax(sse))
+    members = labels == worst
+    new_label = len(centers)
+
+    if np.count_nonzero(members) < 2:
+        # Nothing to split: the new centre goes on the point worst served by its centroid
+        new_center = data[np.argmax(sq_dist)]
+        centers = np.vstack([centers, new_center])
+        labels = labels.copy()
+        labels[np.argmax(sq_dist)] = new_label
+        return centers, labels
+
+    # Direzione principale del cluster: i due nuovi centri sono c ± sqrt(2λ/π)·v,
+    # cioè i baricentri delle due metà di una gaussiana tagliata lungo v
+    points = data[members]
+    aweights = None if sample_weight is None else sample_weight[members]
+    eigenvalues, eigenvectors = np.linalg.eigh(np.cov(points, rowvar=False, aweights=aweights))
+    direction = eigenvectors[:, -1]
+    offset = np.sqrt(2 * max(eigenvalues[-1], 0) / np.pi) * direction
+    center = centers[worst]
+
+    centers = np.vstack([centers, center - offset])
+    centers[worst] = center + offset
+    labels = labels.copy()
+    side = (points - center) @ direction < 0
+    labels[np.flatnonzero(members)[side]] = new_label
+    return centers, labels
+
+
+def resolve_n_jobs(n_jobs, n_tasks):
+    """
+    Translate an n_jobs setting (None/1 = sequential, -1 = all cores) into a worker count.
+    """
+    if n_jobs is None or n_tasks <= 1:
+        return 1
+    if n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    return max(1, min(n_jobs, n_tasks))
@@ -0,0 +1,80 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.cluster.hierarchy import linkage
+from scipy.spatial.distance import pdist
+from threadpoolctl import threadpool_limits
+from Testing.Clustering.SharedArray import share_array, attach_array
+from Testing.Clustering.KSweep import resolve_n_jobs, POOL_MIN_POINTS
+
+# Metodi definiti sulla geometria dei punti (centroidi): si calcolano dalle coordinate
+GEOMETRIC_METHODS = ("ward", "centroid", "median")
+
+# Stato del processo worker: coordinate e distanze condensate agganciate una sola volta
+_worker_shm = []
+_worker_coordinates = None
+_worker_distances = None
+
+
+def _init_worker(coordinates_handle, distances_handle, blas_threads):
+    """
+    Attach the worker to the shared coordinates and condensed distances (if any) and cap its
+    BLAS/OpenMP thread pools.
+    """
+    global _worker_shm, _worker_coordinates, _worker_distances
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(blas_threads)
+    threadpool_limits(blas_threads)
+    shm, _worker_coordinates = attach_array(*coordinates_handle)
+    _worker_shm = [shm]
+    if distances_handle is not None:
+        shm, _worker_distances = attach_array(*distances_handle)
+        _worker_shm.append(shm)
+
+
+def _linkage_shared(method):
+    return build_linkage(_worker_coordinates, _worker_distances, method)
+
+
+def build_linkage(coordinates, distances, method):
+    """
+    Linkage matrix for one method: ward, centroid and median are built from the coordinates
+    (they need the Euclidean geometry of the points), the other methods from the condensed
+    distance vector. Both paths give the same matrix as linkage(coordinates, method).
+    """
+    if method in GEOMETRIC_METHODS or distances is None:
+        return linkage(coordinates, method=method)
+    return linkage(distances, method=method)
+
+
+def sweep_linkages(coordinates, methods, n_jobs=None, pool_min_points=POOL_MIN_POINTS):
+    """
+    Build the linkage matrix of every method in `methods` and return {method: linkage}.
+
+    The condensed distance vector is computed once (only if a non-geometric method is asked)
+    and, with n_jobs > 1, shared read-only with a process pool together with the coordinates;
+    each worker builds one linkage with a single BLAS thread. scipy still copies the vector
+    inside the methods that update distances while merging, so the peak memory is one condensed
+    vector per running worker plus the shared one. Below pool_min_points points the linkages are
+    built sequentially, since starting the pool costs more than the linkages themselves.
+    """
+    coordinates = np.ascontiguousarray(coordinates, dtype=np.float64)
+    methods = list(dict.fromkeys(methods))
+    distances = pdist(coordinates) if any(method not in GEOMETRIC_METHODS for method in methods) else None
+    n_jobs = resolve_n_jobs(n_jobs, len(methods)) if len(coordinates) >= pool_min_points else 1
+
+    if n_jobs == 1:
+        return {method: build_linkage(coordinates, distances, method) for method in methods}
+
+    with share_array(coordinates) as coordinates_handle:
+        if distances is None:
+            return _run_pool(methods, n_jobs, coordinates_handle, None)
+        with share_array(distances) as distances_handle:
+            return _run_pool(methods, n_jobs, coordinates_handle, distances_handle)
+
+
+def _run_pool(methods, n_jobs, coordinates_handle, distances_handle):
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                             initargs=(coordinates_handle, distances_handle, 1)) as executor:
+        futures = {method: executor.submit(_linkage_shared, method) for method in methods}
+        return {method: futures[method].result() for method in methods}
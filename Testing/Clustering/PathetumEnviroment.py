@@ -1,12 +1,130 @@
+import atexit
+import io
+import itertools
+import os
+import queue
+import re
+import threading
 import pandas as pd
 import numpy as np
 from shapely.geometry import MultiPoint
 import plotly.graph_objects as go
+import matplotlib.pyplot as plt
+
+RENDER_MODES = ("show", "headless", "skip")
+
+
+class FigureRenderer:
+    """
+    Background thread that writes queued Plotly/Matplotlib figures to disk, so the
+    clustering thread never waits on rendering. Matplotlib is not thread-safe: its figures
+    are rendered to PNG bytes by submit, on the calling thread, and only written by the worker.
+    """
+    def __init__(self, output_dir="figures", formats=("html",)):
+        self.output_dir = output_dir
+        self.formats = tuple(formats)
+        self._queue = queue.Queue()
+        self._counter = itertools.count()
+        self._thread = threading.Thread(target=self._run, name="FigureRenderer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, figure, name):
+        """
+        Queue a figure for writing and return immediately.
+        """
+        if hasattr(figure, "savefig"):
+            buffer = io.BytesIO()
+            figure.savefig(buffer, format="png")
+            figure = buffer.getvalue()
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_") or "figure"
+        self._queue.put((figure, f"{next(self._counter):04d}_{slug}"))
+
+    def flush(self):
+        """
+        Block until every queued figure has been written.
+        """
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            figure, filename = self._queue.get()
+            try:
+                self._write(figure, os.path.join(self.output_dir, filename))
+            except Exception as error:
+                print(f"Rendering of {filename} failed: {error}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, figure, path):
+        os.makedirs(self.output_dir, exist_ok=True)
+        if isinstance(figure, bytes):
+            # Figure Matplotlib già rasterizzate da submit: l'HTML non è disponibile, si salva sempre il PNG
+            with open(path + ".png", "wb") as file:
+                file.write(figure)
+            return
+        if "html" in self.formats:
+            figure.write_html(path + ".html", include_plotlyjs="cdn")
+        if "png" in self.formats:
+            figure.write_image(path + ".png")  # Richiede kaleido
 
 
 class ClusterEnvironment:
-    def __init__(self):
+    # Configurazione di rendering condivisa da tutte le istanze (vedi configure_rendering)
+    render_mode = "show"
+    output_dir = "figures"
+    formats = ("html",)
+    _renderer = None
+
+    def __init__(self, render_mode=None):
         self.data = pd.DataFrame(columns=["x", "y", "label_cluster"])
+        if render_mode is not None:
+            self.render_mode = render_mode
+
+    @classmethod
+    def configure_rendering(cls, mode="show", output_dir="figures", formats=("html",)):
+        """
+        Configure once how every analysis class renders its figures:
+        'show' opens them (blocking, the default), 'headless' queues them to a background
+        renderer that writes HTML/PNG files to output_dir, 'skip' does not build them at all.
+        """
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode '{mode}'. Use one of {RENDER_MODES}.")
+        cls.flush_rendering()
+        cls.render_mode = mode
+        cls.output_dir = output_dir
+        cls.formats = tuple(formats)
+        cls._renderer = None
+
+    @classmethod
+    def flush_rendering(cls):
+        """
+        Wait until the background renderer has written every queued figure.
+        """
+        if ClusterEnvironment._renderer is not None:
+            ClusterEnvironment._renderer.flush()
+
+    @property
+    def plots_enabled(self):
+        return self.render_mode != "skip"
+
+    def render(self, figure, name):
+        """
+        Show, queue for writing or drop a Plotly or Matplotlib figure according to the render mode.
+        """
+        if self.render_mode == "headless":
+            if ClusterEnvironment._renderer is None:
+                ClusterEnvironment._renderer = FigureRenderer(self.output_dir, self.formats)
+            ClusterEnvironment._renderer.submit(figure, name)
+            if hasattr(figure, "savefig"):
+                plt.close(figure)  # Già rasterizzata da submit: la figura può uscire da pyplot
+        elif self.render_mode == "show":
+            if hasattr(figure, "savefig"):
+                plt.show()
+            else:
+                figure.show()
+        elif hasattr(figure, "savefig"):
+            plt.close(figure)
 
     def update_environment(self, new_data, n_clusters=3, step_title="Algorithm Step"):
         """
@@ -19,7 +137,8 @@ class ClusterEnvironment:
 
         # Update the data environment
         self.data = new_data.copy()
-        self._visualize(step_title)
+        if self.plots_enabled:
+            self._visualize(step_title)
 
     def _visualize(self, title="Clustered Data"):
 
@@ -104,4 +223,4 @@ class ClusterEnvironment:
 
         # Create the figure and show it
         fig = go.Figure(data=[scatter] + cluster_polygons, layout=layout)
-        fig.show()
+        self.render(fig, title)
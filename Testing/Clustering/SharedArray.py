@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import numpy as np
+
+
+@contextmanager
+def share_array(array):
+    """
+    Copy a NumPy array into a named shared memory block and yield the (name, shape, dtype)
+    handle that worker processes need to attach to it. The block is released on exit.
+    """
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    try:
+        shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+        shared[...] = array
+        yield shm.name, array.shape, array.dtype.str
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def attach_array(name, shape, dtype):
+    """
+    Attach to a shared memory block created by `share_array` and return a read-only view on it.
+    The SharedMemory object is returned too, because the view is only valid while it is alive.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    array.flags.writeable = False
+    return shm, array
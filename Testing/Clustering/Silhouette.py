@@ -0,0 +1,102 @@
+import numpy as np
+from scipy.spatial.distance import cdist
+from scipy.stats import norm
+from sklearn.metrics import silhouette_score
+
+SILHOUETTE_MODES = ("sklearn", "exact", "sampled")
+
+
+def silhouette_values(data, labels, rows=None, block_size=1024, weights=None):
+    """
+    Silhouette coefficient of the points in `rows` (default: all points), measured against the
+    whole dataset. Distances are computed in blocks of `block_size` rows, so memory stays at
+    block_size x n instead of n x n. With `weights` every point counts as that many coincident
+    points (e.g. the representatives of a coreset).
+    """
+    data = np.asarray(data, dtype=np.float64)
+    labels = np.asarray(labels)
+    rows = np.arange(len(data)) if rows is None else np.asarray(rows)
+    weights = np.ones(len(data)) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    # Punti ordinati per cluster: le somme delle distanze per cluster diventano un reduceat
+    _, codes, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    codes = codes.ravel()
+    order = np.argsort(codes, kind="stable")
+    sorted_data = data[order]
+    sorted_weights = weights[order]
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    sizes = np.bincount(codes, weights=weights)
+
+    values = np.empty(len(rows))
+    for begin in range(0, len(rows), block_size):
+        block = rows[begin:begin + block_size]
+        sums = np.add.reduceat(cdist(data[block], sorted_data) * sorted_weights, starts, axis=1)
+        own = codes[block]
+        own_size = sizes[own]
+
+        a = sums[np.arange(len(block)), own] / np.maximum(own_size - 1, 1)
+        means = sums / sizes
+        means[np.arange(len(block)), own] = np.inf
+        b = means.min(axis=1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            s = (b - a) / np.maximum(a, b)
+        # Come in sklearn: 0 per i cluster con un solo punto (e per a = b = 0)
+        s[(own_size <= 1) | ~np.isfinite(s)] = 0.0
+        values[begin:begin + len(block)] = s
+
+    return values
+
+
+def estimate_silhouette(data, labels, mode="sklearn", sample_size=10000, block_size=1024,
+                        confidence=0.95, random_state=42, weights=None):
+    """
+    Mean silhouette score and its confidence interval, as (score, (low, high)).
+
+    - 'sklearn': sklearn.metrics.silhouette_score, the reference value.
+    - 'exact': same value, computed by streaming distance blocks (bounded memory).
+    - 'sampled': stratified per-cluster sample of about `sample_size` points, each scored
+      against the full dataset; the interval comes from the stratified standard error.
+    The interval collapses to the score itself for the exact modes.
+    With `weights` (coreset representatives) the weighted exact score is returned in every mode.
+    """
+    labels = np.asarray(labels)
+    if weights is not None:
+        if len(np.unique(labels)) < 2:
+            raise ValueError("Silhouette requires at least 2 clusters.")
+        weights = np.asarray(weights, dtype=np.float64)
+        values = silhouette_values(data, labels, block_size=block_size, weights=weights)
+        score = float(np.average(values, weights=weights))
+        return score, (score, score)
+    if mode == "sklearn":
+        score = silhouette_score(data, labels)
+        return score, (score, score)
+    if mode not in SILHOUETTE_MODES:
+        raise ValueError(f"Unknown silhouette mode '{mode}'. Use one of {SILHOUETTE_MODES}.")
+    if len(np.unique(labels)) < 2:
+        raise ValueError("Silhouette requires at least 2 clusters.")
+
+    if mode == "exact" or len(labels) <= sample_size:
+        score = float(np.mean(silhouette_values(data, labels, block_size=block_size)))
+        return score, (score, score)
+
+    # Campionamento stratificato: ogni cluster contribuisce in proporzione alla sua dimensione
+    rng = np.random.default_rng(random_state)
+    _, codes, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    quotas = np.clip(np.round(sample_size * sizes / len(labels)).astype(int), min(2, sizes.min()), sizes)
+
+    samples = [rng.choice(np.flatnonzero(codes == cluster), size=quota, replace=False)
+               for cluster, quota in enumerate(quotas)]
+    values = np.split(silhouette_values(data, labels, rows=np.concatenate(samples), block_size=block_size),
+                      np.cumsum(quotas)[:-1])
+
+    score, variance = 0.0, 0.0
+    for size, quota, cluster_values in zip(sizes, quotas, values):
+        share = size / len(labels)
+        score += share * cluster_values.mean()
+        if quota > 1:
+            # Errore standard del cluster con correzione per popolazione finita
+            variance += share ** 2 * cluster_values.var(ddof=1) / quota * (1 - quota / size)
+
+    margin = norm.ppf(0.5 + confidence / 2) * np.sqrt(variance)
+    return float(score), (float(score - margin), float(score + margin))
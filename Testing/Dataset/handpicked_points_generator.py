@@ -213,10 +213,12 @@ class SyntheticDatasetGenerator:
             screen_y = (y - self.offset_y) * self.scale_factor
             self.canvas.create_oval(screen_x - 5, screen_y - 5, screen_x + 5, screen_y + 5, fill="red")
     def simulate_iterations(self):
+        # point_id: stabile per i punti fissi (il loro indice) tra un'iterazione e l'altra, nuovo per gli altri
+        next_point_id = len(self.fixed_points)
         for iteration in range(self.iterations):
             current_points = []
 
-            for point in self.fixed_points:
+            for point_id, point in enumerate(self.fixed_points):
                 x, y = point['x'], point['y']
 
                 if random.random() < self.change_factor:
@@ -226,7 +228,8 @@ class SyntheticDatasetGenerator:
                 x = max(0, min(self.map_size, x))
                 y = max(0, min(self.map_size, y))
 
-                current_points.append({'x': x, 'y': y, 'type': 'fixed', 'frequency': point['frequency']})
+                current_points.append({'point_id': point_id, 'x': x, 'y': y, 'type': 'fixed',
+                                       'frequency': point['frequency']})
 
             for region in self.regions_of_interest:
                 if random.random() < self.frequency_factor:
@@ -252,6 +255,9 @@ class SyntheticDatasetGenerator:
                 current_points.append({'x': x, 'y': y, 'type': 'random', 'frequency': 1})
 
             for point in current_points:
+                if 'point_id' not in point:
+                    point['point_id'] = next_point_id
+                    next_point_id += 1
                 point['iteration'] = iteration
             self.all_iterations.extend(current_points)
 
@@ -1,8 +1,16 @@
+import time
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import pdist, squareform
 from Testing.Clustering.Algoritmi.KMEANS import KMeansAnalysis
 from Testing.Clustering.Algoritmi.DBSCAN import DBSCANAnalysis
 from Testing.Clustering.Algoritmi.GerarchicoDivisivo import HDClusterAnalysis
 from Testing.Clustering.Algoritmi.GerarchicoAgglomerativo import HAClusterAnalysis
 from Testing.Clustering.Algoritmi.KRUSKAL import KruskalClustering  # Assuming KruskalClustering is saved here
+from Testing.Clustering.Algoritmi.CapacitatedKMEANS import CapacitatedKMeansAnalysis
+from Testing.Clustering.IncrementalDBSCAN import IncrementalDBSCAN
+from Testing.Clustering.GridDBSCAN import GridDBSCAN
+from Testing.Clustering.PathetumEnviroment import ClusterEnvironment
 from Testing.Dataset import random_points_generator as rpg
 from Testing.Dataset import iteration_dataframe_parser as parser
 
@@ -35,17 +43,101 @@ def kmeans_example(datasets):
         data, kmeans = kmeans_analysis.perform_clustering(dataset)
         data, kmeans = kmeans_analysis.perform_clustering(dataset, False)
 
+# Example execution for KMeans over consecutive iterations (warm start from the previous centroids)
+def kmeans_iterations_example(iterations):
+    if iterations is None:
+        iterations = parser.load_and_parse_iterations("./Data/hand_picked_points.csv")
+
+    kmeans_analysis = KMeansAnalysis(n_clusters=20, max_clusters=60)
+    report = kmeans_analysis.cluster_iterations(iterations)
+
+    warm = [entry for entry in report if not entry['cold']]
+    if warm:
+        print(f"Warm iterations: {len(warm)}/{len(report)}, "
+              f"mean speedup x{sum(entry['speedup'] for entry in warm) / len(warm):.1f}")
+
 # Example execution for DBSCAN
 def dbscan_example(datasets):
     if datasets is None:
         datasets = generate_datasets()
 
-    dbscan_analysis = DBSCANAnalysis(eps=10, min_samples=5)
+    # eps="auto": eps dal ginocchio della curva delle k-distanze (k = min_samples) di ogni dataset
+    dbscan_analysis = DBSCANAnalysis(eps="auto", min_samples=5)
 
     for dataset_name, dataset in datasets.items():
         print(f"\nTesting {dataset_name} with DBSCAN...")
         data, dbscan = dbscan_analysis.perform_clustering(dataset)
 
+# Example execution for DBSCAN over consecutive iterations (incremental: only the changed points are reclustered)
+def dbscan_iterations_example(iterations):
+    if iterations is None:
+        iterations = parser.load_and_parse_iterations("./Data/hand_picked_points.csv")
+
+    # Con point_id un punto fisso spostato è un solo "move"; senza, le righe si riconoscono dalle coordinate
+    id_column = "point_id" if "point_id" in next(iter(iterations.values())).columns else None
+    if id_column is None:
+        print("No point_id column: points are matched by coordinates (regenerate the CSV to get stable ids)")
+    incremental_analysis = DBSCANAnalysis(eps=10, min_samples=5, engine="incremental", id_column=id_column)
+    full_analysis = DBSCANAnalysis(eps=10, min_samples=5)
+
+    for iteration, data in iterations.items():
+        start = time.perf_counter()
+        incremental_analysis.perform_clustering(data)
+        incremental_time = time.perf_counter() - start
+        labels = data['label_cluster'].to_numpy()
+
+        start = time.perf_counter()
+        full_analysis.perform_clustering(data)
+        full_time = time.perf_counter() - start
+        print(f"Iteration {iteration}: incremental {incremental_time:.3f}s, full {full_time:.3f}s, "
+              f"same labels: {np.array_equal(labels, data['label_cluster'].to_numpy())}")
+
+# Example execution for incremental DBSCAN on a stream of orders: each update adds, cancels and moves a few
+# orders (keyed by order_id) and only those are reclustered; the full grid DBSCAN is timed for comparison
+def dbscan_order_stream_example(n_orders=20000, n_updates=10, changes_per_update=20, eps=1.0, min_samples=5):
+    rng = np.random.default_rng(rpg.get_random_seed())
+    orders = rpg.generate_gaussian_clusters(n_clusters=5, n_points_per_cluster=n_orders // 5, cluster_spread=10)
+    orders['order_id'] = np.arange(len(orders))
+    next_order_id = len(orders)
+    incremental = IncrementalDBSCAN(eps=eps, min_samples=min_samples)
+    incremental.sync(orders[['x', 'y']].to_numpy(), keys=orders['order_id'])
+
+    for update in range(n_updates):
+        # Ordini cancellati, spostati e nuovi (vicino a ordini esistenti)
+        orders = orders.drop(index=rng.choice(orders.index, changes_per_update, replace=False))
+        moved = rng.choice(orders.index, changes_per_update, replace=False)
+        orders.loc[moved, ['x', 'y']] += rng.normal(0, eps, (changes_per_update, 2))
+        new = orders.sample(changes_per_update, random_state=int(rng.integers(2 ** 31)))[['x', 'y']] + \
+            rng.normal(0, eps, (changes_per_update, 2))
+        new['order_id'] = np.arange(next_order_id, next_order_id + changes_per_update)
+        next_order_id += changes_per_update
+        orders = pd.concat([orders, new], ignore_index=True)
+        coordinates = orders[['x', 'y']].to_numpy()
+
+        start = time.perf_counter()
+        incremental.sync(coordinates, keys=orders['order_id'])
+        incremental_time = time.perf_counter() - start
+        start = time.perf_counter()
+        labels = GridDBSCAN(eps=eps, min_samples=min_samples).fit_predict(coordinates)
+        full_time = time.perf_counter() - start
+
+        changes = incremental.last_changes
+        print(f"Update {update}: {changes['inserted']} inserted, {changes['deleted']} deleted, "
+              f"{changes['moved']} moved ({'rebuilt' if changes['refit'] else 'local update'}); "
+              f"incremental {incremental_time:.3f}s, full {full_time:.3f}s, "
+              f"same labels: {np.array_equal(labels, incremental.labels_)}")
+
+# Example execution for a DBSCAN eps sweep (one reachability computation, O(n) per eps)
+def dbscan_eps_sweep_example(datasets, eps_values=(2, 4, 6, 8, 10, 12, 15)):
+    if datasets is None:
+        datasets = generate_datasets()
+
+    dbscan_analysis = DBSCANAnalysis(min_samples=5)
+
+    for dataset_name, dataset in datasets.items():
+        print(f"\nEps sweep on {dataset_name}...")
+        dbscan_analysis.eps_sweep(dataset, eps_values)
+
 # Example execution for Divisive Clustering
 def divisive_clustering_example(datasets):
     if datasets is None:
@@ -57,6 +149,70 @@ def divisive_clustering_example(datasets):
         print(f"\nTesting {dataset_name} with Divisive Clustering...")
         divisive_analysis.perform_clustering(dataset)
 
+# Micro-benchmark of the divisive split kernel: vectorized (and bisecting) against the per-point loops
+def divisive_split_benchmark(sizes=(1000, 10000, 100000, 1000000), bisecting_iter=10, original_max_size=5000):
+    def original_split(coordinates, distances):
+        # Kernel originale, invariato: riceve la matrice m x m e ricalcola la media della riga del seme a ogni
+        # punto (O(m^2)); si misura solo fino a original_max_size punti
+        centroid = coordinates.mean(axis=0)
+        farthest_point = np.argmax(np.linalg.norm(coordinates - centroid, axis=1))
+        cluster1, cluster2 = [farthest_point], []
+        for i in range(len(coordinates)):
+            if i != farthest_point:
+                if distances[farthest_point, i] < np.mean(distances[farthest_point, :]):
+                    cluster1.append(i)
+                else:
+                    cluster2.append(i)
+        labels = np.zeros(len(coordinates))
+        labels[cluster2] = 1
+        return labels
+
+    def simplified_loop_split(coordinates):
+        # Versione semplificata del kernel originale (non è il codice sostituito): soglia calcolata una volta
+        # fuori dal ciclo e distanze dal solo seme, resta il confronto per punto in Python
+        centroid = coordinates.mean(axis=0)
+        farthest_point = np.argmax(np.linalg.norm(coordinates - centroid, axis=1))
+        seed_distances = np.linalg.norm(coordinates - coordinates[farthest_point], axis=1)
+        threshold = np.mean(seed_distances)
+        labels = np.zeros(len(coordinates))
+        for i in range(len(coordinates)):
+            if i != farthest_point and seed_distances[i] >= threshold:
+                labels[i] = 1
+        return labels
+
+    def split_sse(coordinates, labels):
+        return sum(((coordinates[labels == side] - coordinates[labels == side].mean(axis=0)) ** 2).sum()
+                   for side in (0, 1) if np.any(labels == side))
+
+    def timed(kernel, *args):
+        start = time.perf_counter()
+        labels = kernel(*args)
+        return time.perf_counter() - start, labels
+
+    vectorized = HDClusterAnalysis()
+    bisecting = HDClusterAnalysis(bisecting_iter=bisecting_iter)
+    rng = np.random.default_rng(42)
+    for size in sizes:
+        coordinates = rng.normal(size=(size, 2)) * [30, 10]
+        vectorized_time, vectorized_labels = timed(vectorized._split_cluster, coordinates)
+        simplified_time, simplified_labels = timed(simplified_loop_split, coordinates)
+        bisecting_time, bisecting_labels = timed(bisecting._split_cluster, coordinates)
+
+        if size <= original_max_size:
+            # La matrice delle distanze veniva costruita da fit_predict: non entra nel tempo del kernel
+            distances = squareform(pdist(coordinates))
+            original_time, original_labels = timed(original_split, coordinates, distances)
+            original = (f"original {original_time:.3f}s (x{original_time / vectorized_time:.0f}, "
+                        f"same labels: {np.array_equal(original_labels, vectorized_labels)}), ")
+        else:
+            original = "original not run (m x m matrix), "
+
+        print(f"{size} points: vectorized {vectorized_time:.4f}s; {original}"
+              f"simplified loop {simplified_time:.3f}s (x{simplified_time / vectorized_time:.0f}, "
+              f"same labels: {np.array_equal(simplified_labels, vectorized_labels)}); "
+              f"bisecting {bisecting_time:.4f}s, split SSE "
+              f"{split_sse(coordinates, vectorized_labels):.4g} -> {split_sse(coordinates, bisecting_labels):.4g}")
+
 # Example execution for Agglomerative Clustering
 def agglomerative_clustering_example(datasets):
     if datasets is None:
@@ -65,15 +221,20 @@ def agglomerative_clustering_example(datasets):
     # Linkage methods to test
     linkage_methods = ["single", "complete", "average", "ward"]
 
+    ha_analysis = HAClusterAnalysis()
+
     for dataset_name, dataset in datasets.items():
         print(f"\nTesting {dataset_name} with Agglomerative Clustering...")
 
+        # All the linkages from one shared distance matrix, built in parallel
+        ha_analysis.evaluate_linkages(dataset, methods=linkage_methods)
+
         for linkage in linkage_methods:
             print(f"\nUsing {linkage.capitalize()} Linkage:")
 
-            ha_analysis = HAClusterAnalysis(linkage_method=linkage)
+            ha_analysis.linkage_method = linkage
 
-            model = ha_analysis.perform_clustering(dataset)
+            ha_analysis.perform_clustering(dataset)
 
             best_threshold = ha_analysis.calculate_best_distance_threshold(dataset)
             print(
@@ -82,6 +243,22 @@ def agglomerative_clustering_example(datasets):
             print(f"Plotting dendrogram for {linkage.capitalize()} Linkage...")
             ha_analysis.plot_dendrogram(dataset, threshold_suggestion=best_threshold)
 
+# Benchmark of kNN connectivity-constrained against unconstrained Agglomerative Clustering
+def agglomerative_connectivity_benchmark(datasets, n_points_per_cluster=3000):
+    if datasets is None:
+        datasets = generate_datasets()
+
+    # Oltre ai dataset di prova, una versione grande dove il vincolo fa la differenza
+    datasets = dict(datasets)
+    datasets["Large Gaussian Clusters"] = rpg.generate_gaussian_clusters(
+        n_clusters=3, n_points_per_cluster=n_points_per_cluster, cluster_spread=5)
+
+    for dataset_name, dataset in datasets.items():
+        for linkage in ["ward", "average"]:
+            print(f"\nBenchmarking {dataset_name} with {linkage.capitalize()} Linkage (kNN connectivity)...")
+            ha_analysis = HAClusterAnalysis(linkage_method=linkage, silhouette_mode="sampled")
+            ha_analysis.connectivity_report(dataset, n_clusters=3)
+
 # Example execution for Kruskal Clustering
 def kruskal_example(datasets):
     if datasets is None:
@@ -96,24 +273,61 @@ def kruskal_example(datasets):
         print(f"Finished clustering for {dataset_name}.")
         kruskal_analysis.visualize_mst(dataset)  # Optional MST visualization
 
+# Example execution for Capacitated (balanced) KMeans
+def capacitated_example(datasets):
+    if datasets is None:
+        datasets = generate_datasets()
+
+    # capacity=None: every courier gets ceil(n / k) orders
+    capacitated_analysis = CapacitatedKMeansAnalysis(n_clusters=10, capacity=None)
+
+    for dataset_name, dataset in datasets.items():
+        print(f"\nTesting {dataset_name} with Capacitated KMeans...")
+        capacitated_analysis.perform_clustering(dataset)
+
 # Main function to execute all examples
 def main():
+    # "show" opens every figure; "headless" writes them to ./Figures from a background thread instead,
+    # "skip" does not build them at all
+    ClusterEnvironment.configure_rendering("show", output_dir="./Figures", formats=("html", "png"))
+
     #datasets = generate_datasets()
     datasets = parser.load_and_parse_iterations("./Data/hand_picked_points.csv")
     print("\nRunning KMeans Example:")
     kmeans_example(datasets)
 
+    #print("\nRunning KMeans Iterations Example (warm start):")
+    #kmeans_iterations_example(datasets)
+
     #print("\nRunning DBSCAN Example:")
     #dbscan_example(datasets)
 
+    #print("\nRunning DBSCAN Eps Sweep Example:")
+    #dbscan_eps_sweep_example(datasets)
+
+    #print("\nRunning DBSCAN Iterations Example (incremental):")
+    #dbscan_iterations_example(datasets)
+
+    #print("\nRunning DBSCAN Order Stream Example (incremental):")
+    #dbscan_order_stream_example()
+
     #print("\nRunning Divisive Clustering Example:")
     #divisive_clustering_example(datasets)
 
+    #print("\nRunning Divisive Split Benchmark:")
+    #divisive_split_benchmark()
+
     #print("\nRunning Agglomerative Clustering Example:")
     #agglomerative_clustering_example(datasets)
 
+    #print("\nRunning Agglomerative Connectivity Benchmark:")
+    #agglomerative_connectivity_benchmark(datasets)
+
     #print("\nRunning Kruskal Clustering Example:")
     #kruskal_example(datasets)
 
+    #print("\nRunning Capacitated KMeans Example:")
+    #capacitated_example(datasets)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from scipy.optimize import linear_sum_assignment
+from sklearn.exceptions import ConvergenceWarning
+from Testing.Clustering.PathetumEnviroment import ClusterEnvironment
+from Testing.Clustering.CapacitatedAssignment import capacitated_assign
+from Testing.Clustering.Algoritmi.CapacitatedKMEANS import CapacitatedKMeansAnalysis
+
+ClusterEnvironment.configure_rendering("skip")
+
+
+def _problems(n_problems=60, seed=0):
+    rng = np.random.default_rng(seed)
+    for index in range(n_problems):
+        n_points, n_clusters = int(rng.integers(2, 60)), int(rng.integers(1, 6))
+        costs = rng.random((n_points, n_clusters)) * 10
+        if index % 3 == 0:
+            costs = np.round(costs)  # Costi ripetuti: molte soluzioni ottime equivalenti
+        capacities = rng.integers(1, n_points + 1, n_clusters)
+        capacities[0] += max(n_points - capacities.sum(), 0)
+        yield rng, costs, capacities
+
+
+def _optimum(costs, capacities):
+    # Ottimo del problema di trasporto: assegnamento sui posti (ogni cluster ripetuto capacity volte)
+    slots = np.repeat(costs, capacities, axis=1)
+    rows, columns = linear_sum_assignment(slots)
+    return slots[rows, columns].sum()
+
+
+def _check(costs, capacities, labels, prices):
+    n_points, n_clusters = costs.shape
+    loads = np.bincount(labels, minlength=n_clusters)
+    assert np.all(loads <= capacities)
+    assert costs[np.arange(n_points), labels].sum() <= _optimum(costs, capacities) + 1e-6
+    # Prezzi duali ottimi: ogni punto nel cluster più economico a costo + prezzo, prezzo 0 sui cluster non pieni
+    reduced = costs + prices
+    assert np.all(reduced[np.arange(n_points), labels] <= reduced.min(axis=1) + 1e-6)
+    assert np.all(prices >= -1e-9) and np.all(prices[loads < capacities] <= 1e-9)
+
+
+def test_capacitated_assign_is_optimal():
+    for _, costs, capacities in _problems():
+        _check(costs, capacities, *capacitated_assign(costs, capacities))
+
+
+def test_capacitated_assign_warm_start_is_optimal():
+    # Prezzi di un problema vicino (costi perturbati), come tra due iterazioni di Lloyd
+    for rng, costs, capacities in _problems(seed=1):
+        _, prices = capacitated_assign(costs, capacities)
+        moved = costs + rng.normal(scale=0.5, size=costs.shape)
+        for repair_limit in (0.0, 1.0):
+            _check(moved, capacities, *capacitated_assign(moved, capacities, prices=prices, repair_limit=repair_limit))
+
+
+def test_fit_capacitated_reports_non_convergence():
+    rng = np.random.default_rng(0)
+    points = rng.normal(size=(400, 2)) * [30, 10] + 50
+    with pytest.warns(ConvergenceWarning):
+        result = CapacitatedKMeansAnalysis(n_clusters=5, max_iter=1).fit_capacitated(points, 5)
+    assert not result["converged"]
+    assert result["loads"].max() <= result["capacities"].max()
+
+    result = CapacitatedKMeansAnalysis(n_clusters=5, max_iter=100).fit_capacitated(points, 5)
+    assert result["converged"]
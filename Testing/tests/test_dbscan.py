@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.cluster import DBSCAN
+from sklearn.metrics import adjusted_rand_score
+from Testing.Clustering.PathetumEnviroment import ClusterEnvironment
+from Testing.Clustering.Algoritmi.DBSCAN import DBSCANAnalysis
+from Testing.Clustering.DensitySweep import sweep_eps
+from Testing.Clustering.GridDBSCAN import GridDBSCAN
+from Testing.Clustering.IncrementalDBSCAN import IncrementalDBSCAN
+
+ClusterEnvironment.configure_rendering("skip")
+
+# Tre punti lontani: con min_samples=2 nessuno è core per eps 1 o 2
+SPARSE_POINTS = [[0, 0], [50, 50], [100, 100]]
+
+
+def test_sweep_eps_without_core_points():
+    results = sweep_eps(SPARSE_POINTS, [1, 2], 2)
+    for eps in (1.0, 2.0):
+        assert np.array_equal(results[eps]['labels'], [-1, -1, -1])
+        assert results[eps]['n_clusters'] == 0
+        assert results[eps]['noise_fraction'] == 1.0
+
+
+def test_incremental_without_core_points():
+    model = IncrementalDBSCAN(eps=1, min_samples=2).fit(SPARSE_POINTS)
+    assert np.array_equal(model.labels_, [-1, -1, -1])
+
+    # Refit da sync, poi un aggiornamento locale che crea il primo cluster
+    model = IncrementalDBSCAN(eps=1, min_samples=2, refit_fraction=1.0)
+    model.sync(SPARSE_POINTS, keys=[0, 1, 2])
+    assert np.array_equal(model.labels_, [-1, -1, -1])
+    model.sync(SPARSE_POINTS + [[0.5, 0]], keys=[0, 1, 2, 3])
+    assert not model.last_changes['refit']
+    assert np.array_equal(model.labels_, [0, -1, -1, 0])
+
+
+def test_incremental_analysis_without_core_points():
+    data = pd.DataFrame(SPARSE_POINTS, columns=['x', 'y'])
+    DBSCANAnalysis(eps=1, min_samples=2, engine="incremental").perform_clustering(data)
+    assert np.array_equal(data['label_cluster'], [-1, -1, -1])
+
+
+def _lattice(n_points, side, scale=1.0, seed=0):
+    # Punti distinti di una griglia intera (anche negativa): molte coppie esattamente a distanza eps,
+    # punti sui bordi delle celle e punti di bordo condivisi tra più cluster
+    rng = np.random.default_rng(seed)
+    cells = rng.choice(side * side, size=n_points, replace=False)
+    return np.column_stack([cells % side - side // 2, cells // side - side // 2]) * scale
+
+
+def _assert_same_as_sklearn(points, eps, min_samples, sample_weight=None):
+    expected = DBSCAN(eps=eps, min_samples=min_samples).fit(points, sample_weight=sample_weight)
+    model = GridDBSCAN(eps=eps, min_samples=min_samples).fit(points, sample_weight=sample_weight)
+    assert np.array_equal(model.labels_, expected.labels_)
+    assert np.array_equal(model.core_sample_indices_, expected.core_sample_indices_)
+
+
+@pytest.mark.parametrize("eps, scale", [(1.0, 1.0), (2.0, 1.0), (0.5, 0.5), (3.0, 1.5)])
+@pytest.mark.parametrize("min_samples", [2, 3, 5])
+def test_grid_dbscan_matches_sklearn_on_integer_grid(eps, scale, min_samples):
+    for seed in range(3):
+        _assert_same_as_sklearn(_lattice(600, 40, scale, seed), eps, min_samples)
+
+
+@pytest.mark.parametrize("min_samples", [3, 6, 10])
+def test_grid_dbscan_matches_sklearn_with_sample_weight(min_samples):
+    rng = np.random.default_rng(1)
+    points = _lattice(600, 40, seed=1)
+    # Pesi interi (rappresentanti di un coreset) e frazionari, con qualche peso nullo
+    for sample_weight in (rng.integers(1, 5, len(points)).astype(float), rng.random(len(points)) * 4,
+                          np.where(rng.random(len(points)) < 0.2, 0.0, 2.0)):
+        _assert_same_as_sklearn(points, 1.0, min_samples, sample_weight)
+
+
+@pytest.mark.parametrize("eps", [1.0, "auto"])
+def test_coreset_cells_follow_eps(eps):
+    # Con celle più larghe di eps ogni intorno conterrebbe circa un solo rappresentante
+    rng = np.random.default_rng(0)
+    centers = np.array([[20, 20], [70, 30], [40, 80]])
+    points = np.vstack([centers[rng.integers(0, 3, 6000)] + rng.normal(scale=3, size=(6000, 2)),
+                        rng.random((600, 2)) * 100])
+    full = DBSCANAnalysis(eps=eps, min_samples=5)
+    full_data = pd.DataFrame(points, columns=['x', 'y'])
+    full.perform_clustering(full_data)
+    compressed = DBSCANAnalysis(eps=eps, min_samples=5, coreset_ratio=0.01)
+    data = pd.DataFrame(points, columns=['x', 'y'])
+    compressed.perform_clustering(data)
+    assert compressed.eps_ == full.eps_
+    assert compressed.coreset['cell_size'] <= compressed.eps_ / np.sqrt(2)
+    assert adjusted_rand_score(full_data['label_cluster'], data['label_cluster']) > 0.95
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from Testing.Clustering.PathetumEnviroment import ClusterEnvironment
+from Testing.Clustering.Algoritmi.KMEANS import KMeansAnalysis
+from Testing.Clustering.FitCache import FitCache
+
+ClusterEnvironment.configure_rendering("skip")
+
+
+def _orders(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.array([[0, 0], [20, 0], [0, 20]])
+    points = centers[rng.integers(0, 3, n)] + rng.normal(scale=2.0, size=(n, 2))
+    return pd.DataFrame(points, columns=['x', 'y'])
+
+
+def test_minibatch_sweep_uses_minibatch_fits():
+    data = _orders()
+    analysis = KMeansAnalysis(max_clusters=5, mode="minibatch", batch_size=256, cache=False)
+    sweep = analysis.k_sweep(data)
+    for k, inertia in zip(sweep['k'], sweep['inertia']):
+        model = MiniBatchKMeans(n_clusters=k, batch_size=256, random_state=42).fit(data[['x', 'y']].to_numpy())
+        assert np.isclose(inertia, model.inertia_)
+
+
+def test_streaming_clustering_matches_partial_fit_chunks():
+    data = _orders()
+    chunks = [data.iloc[i:i + 500] for i in range(0, len(data), 500)]
+    analysis = KMeansAnalysis(n_clusters=3, random_state=7, silhouette_sample_size=1000)
+    streamed, silhouette = analysis.perform_streaming_clustering(chunks)
+    fitted = analysis.partial_fit_chunks(chunks)
+    assert np.allclose(streamed.cluster_centers_, fitted.cluster_centers_)
+    assert silhouette is not None
+
+
+def test_final_fit_reuses_the_sweep_fit():
+    data = _orders()
+    cache = FitCache()
+    analysis = KMeansAnalysis(max_clusters=5, random_state=42, cache=cache)
+    analysis.k_sweep(data)
+    entries = cache.stats()["entries"]
+    hits = cache.hits
+
+    kmeans, _ = analysis.perform_clustering(data)
+    assert cache.hits == hits + 5  # 4 fit dello sweep + il fit finale con il k scelto
+    assert cache.stats()["entries"] == entries
+    assert FitCache.make_key("f", "kmeans", n_clusters=np.int64(5)) == FitCache.make_key("f", "kmeans", n_clusters=5)
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.spatial import distance_matrix
+from scipy.sparse.csgraph import minimum_spanning_tree, connected_components
+from Testing.Clustering.PathetumEnviroment import ClusterEnvironment
+from Testing.Clustering.Algoritmi.KRUSKAL import KruskalClustering
+from Testing.Dataset import random_points_generator as rpg
+
+ClusterEnvironment.configure_rendering("skip")
+
+GENERATORS = (rpg.generate_gaussian_clusters, rpg.generate_cluster_chains, rpg.generate_clusters_with_outliers,
+              rpg.generate_hierarchical_clusters)
+
+
+def _dense_kruskal(data, n_clusters):
+    # Implementazione densa originale: matrice n x n, MST, taglio degli n_clusters - 1 archi più lunghi
+    mst = minimum_spanning_tree(distance_matrix(data[['x', 'y']], data[['x', 'y']])).toarray()
+    edges = sorted([(mst[i, j], i, j) for i in range(len(mst)) for j in range(len(mst)) if mst[i, j] > 0],
+                   key=lambda x: x[0], reverse=True)
+    for _ in range(n_clusters - 1):
+        if edges:
+            _, i, j = edges.pop(0)
+            mst[i, j] = 0
+            mst[j, i] = 0
+    return connected_components(csgraph=mst, directed=False)
+
+
+def _datasets():
+    for generator in GENERATORS:
+        data = generator(random_seed=1)[['x', 'y']]
+        yield f"{generator.__name__}", data
+        # Coordinate intere: molti archi di uguale lunghezza
+        yield f"{generator.__name__}_rounded", data.round(0)
+        yield f"{generator.__name__}_duplicates", pd.concat([data, data.iloc[::7]], ignore_index=True)
+    # Griglie intere a passo 1 separate da distanze diverse: archi interni tutti lunghi 1
+    grid = np.stack(np.meshgrid(np.arange(6), np.arange(6)), axis=-1).reshape(-1, 2)
+    yield "integer_grids", pd.DataFrame(np.vstack([grid, grid + [20, 0], grid + [0, 35], grid[:10]]),
+                                        columns=['x', 'y'])
+
+
+@pytest.mark.parametrize("name, data", list(_datasets()))
+def test_delaunay_labels_match_dense_mst(name, data):
+    weights = np.sort(minimum_spanning_tree(distance_matrix(data, data)).data)[::-1]
+    analysis = KruskalClustering(cache=False)
+    for n_clusters in range(1, 11):
+        # Taglio dentro archi di pari lunghezza: la partizione dipende da quale MST si sceglie
+        if n_clusters > 1 and weights[n_clusters - 2] == weights[n_clusters - 1]:
+            continue
+        n_components, labels = _dense_kruskal(data, n_clusters)
+        new_labels, new_components = analysis.labels_for_k(data, n_clusters)
+        assert new_components == n_components, (name, n_clusters)
+        assert np.array_equal(new_labels, labels), (name, n_clusters)
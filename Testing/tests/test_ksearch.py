@@ -0,0 +1,32 @@
+from Testing.Clustering.KSearch import search_elbow, search_silhouette_max
+
+
+def _lookup(curve):
+    return lambda k_values: {k: curve[k] for k in k_values}
+
+
+def test_elbow_search_falls_back_on_a_skipped_earlier_elbow():
+    # Il primo salto piccolo è a k=8, tra i punti 6 e 11 della griglia grossolana
+    drops = {k: 1.0 if k == 8 or k >= 12 else 100.0 for k in range(2, 60)}
+    inertia = {2: 10000.0}
+    for k in range(2, 60):
+        inertia[k + 1] = inertia[k] - drops[k]
+    best_k, _ = search_elbow(_lookup(inertia), 2, 60)
+    assert best_k is None
+
+
+def test_silhouette_search_falls_back_on_a_higher_score_outside_the_bracket():
+    scores = {k: 0.5 - abs(k - 11) / 100 for k in range(2, 61)}
+    scores[5] = 0.9  # Fuori dalla parentesi [6, 19] e non sulla griglia
+    best_k, _ = search_silhouette_max(_lookup(scores), 2, 60)
+    assert best_k is None
+
+
+def test_searches_match_the_exhaustive_optimum_on_regular_curves():
+    inertia = {k: 1000.0 / k ** 2 for k in range(2, 61)}
+    drops = [inertia[k] - inertia[k + 1] for k in range(2, 60)]
+    expected = next(k for k, d in zip(range(2, 60), drops) if d < 0.1 * drops[0])
+    assert search_elbow(_lookup(inertia), 2, 60)[0] == expected
+
+    scores = {k: 0.5 - abs(k - 23) / 100 for k in range(2, 61)}
+    assert search_silhouette_max(_lookup(scores), 2, 60)[0] == 23
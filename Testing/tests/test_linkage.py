@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from scipy.cluster.hierarchy import linkage
+from Testing.Clustering import LinkageSweep
+from Testing.Clustering.LinkageSweep import sweep_linkages
+
+METHODS = ("single", "complete", "average", "ward")
+
+
+def _points(n=300, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, 2)) * [30, 10]
+
+
+def test_small_inputs_stay_sequential(monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("process pool started for a small dataset")
+
+    monkeypatch.setattr(LinkageSweep, "_run_pool", no_pool)
+    coordinates = _points()
+    linkages = sweep_linkages(coordinates, METHODS, n_jobs=-1)
+    for method in METHODS:
+        assert np.allclose(linkages[method], linkage(coordinates, method=method))
+
+
+@pytest.mark.parametrize("methods", [METHODS, ("ward", "centroid")])
+def test_pooled_sweep_matches_sequential(methods):
+    coordinates = _points(200, seed=1)
+    pooled = sweep_linkages(coordinates, methods, n_jobs=2, pool_min_points=0)
+    for method in methods:
+        assert np.allclose(pooled[method], linkage(coordinates, method=method))
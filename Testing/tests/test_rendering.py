@@ -0,0 +1,24 @@
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from Testing.Clustering.PathetumEnviroment import ClusterEnvironment, FigureRenderer
+
+
+def test_headless_matplotlib_figures_are_rendered_on_the_calling_thread(tmp_path, monkeypatch):
+    written = []
+    original = FigureRenderer._write
+    monkeypatch.setattr(FigureRenderer, "_write",
+                        lambda self, figure, path: written.append(type(figure)) or original(self, figure, path))
+    ClusterEnvironment.configure_rendering("headless", output_dir=str(tmp_path))
+    try:
+        fig = plt.figure()
+        plt.plot([0, 1], [0, 1])
+        ClusterEnvironment().render(fig, "Elbow Method")
+        ClusterEnvironment.flush_rendering()
+    finally:
+        ClusterEnvironment.configure_rendering("skip")
+
+    # Il thread in background riceve solo i byte del PNG, mai la figura
+    assert written == [bytes]
+    assert (tmp_path / "0000_Elbow_Method.png").read_bytes().startswith(b"\x89PNG")
+    assert plt.get_fignums() == []